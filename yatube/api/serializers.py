@@ -0,0 +1,78 @@
+'''Сериализация словарей из .values() без создания объектов моделей.
+
+Для каждого ресурса задано соответствие полей ответа путям ORM и
+преобразования значений; клиент выбирает поля параметром fields.
+'''
+from django.core.files.storage import default_storage
+
+
+class BadRequest(Exception):
+    '''Неверные параметры запроса: API отвечает на них 400'''
+
+
+def image_url(name):
+    return default_storage.url(name) if name else None
+
+
+class Resource:
+    def __init__(self, fields, transforms=None, always=()):
+        self.fields = fields
+        self.transforms = transforms or {}
+        self.always = always
+
+    def select(self, requested):
+        '''Поля ответа по параметру fields; неизвестные дают BadRequest'''
+        if not requested:
+            return list(self.fields)
+        names = [name for name in requested.split(',') if name]
+        unknown = set(names) - self.fields.keys()
+        if unknown:
+            raise BadRequest(
+                'Неизвестные поля: ' + ', '.join(sorted(unknown)))
+        return names
+
+    def paths(self, names):
+        '''Пути ORM для values(): выбранные поля и поля ключа страницы'''
+        paths = [self.fields[name] for name in names]
+        return paths + [path for path in self.always if path not in paths]
+
+    def serialize(self, row, names):
+        result = {}
+        for name in names:
+            value = row[self.fields[name]]
+            transform = self.transforms.get(name)
+            result[name] = transform(value) if transform else value
+        return result
+
+
+POST = Resource(
+    {
+        'id': 'id',
+        'text': 'text',
+        'pub_date': 'pub_date',
+        'author': 'author__username',
+        'group': 'group__slug',
+        'image': 'image',
+    },
+    transforms={'image': image_url},
+    always=('pub_date', 'id'),
+)
+
+COMMENT = Resource(
+    {
+        'id': 'id',
+        'post': 'post_id',
+        'author': 'author__username',
+        'text': 'text',
+        'created': 'created',
+    },
+    always=('created', 'id'),
+)
+
+GROUP = Resource({
+    'id': 'id',
+    'title': 'title',
+    'slug': 'slug',
+    'description': 'description',
+    'posts_count': 'posts_count',
+})
@@ -0,0 +1,99 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+from posts.tests.utils import QueryBudgetMixin
+
+from .serializers import POST
+
+User = get_user_model()
+
+
+class ApiTest(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        cls.posts = [
+            Post.objects.create(author=cls.author, group=cls.group,
+                                text=f'Пост {number}')
+            for number in range(15)
+        ]
+        for number in range(3):
+            Comment.objects.create(post=cls.posts[0], author=cls.reader,
+                                   text=f'Комментарий {number}')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def test_posts_cursor_pages(self):
+        """Посты отдаются страницами по курсору одним запросом каждая"""
+        response = self.assertQueryBudget(
+            self.guest_client, reverse('api:posts'), 1)
+        data = response.json()
+        self.assertEqual(len(data['results']), 10)
+        self.assertEqual(data['results'][0]['text'], 'Пост 14')
+        self.assertEqual(data['results'][0]['author'], 'author')
+        self.assertIsNone(data['previous'])
+        second = self.guest_client.get(reverse('api:posts') + data['next'])
+        self.assertEqual(
+            [row['text'] for row in second.json()['results']],
+            [f'Пост {number}' for number in range(4, -1, -1)],
+        )
+        self.assertIsNone(second.json()['next'])
+
+    def test_field_selection(self):
+        """Параметр fields оставляет в ответе только выбранные поля"""
+        response = self.guest_client.get(
+            reverse('api:posts'), {'fields': 'id,group', 'limit': 2})
+        self.assertEqual(response.json()['results'], [
+            {'id': self.posts[14].pk, 'group': 'group'},
+            {'id': self.posts[13].pk, 'group': 'group'},
+        ])
+        bad = self.guest_client.get(reverse('api:posts'), {'fields': 'pwd'})
+        self.assertEqual(bad.status_code, 400)
+        bad = self.guest_client.get(reverse('api:posts'), {'limit': 'ten'})
+        self.assertEqual(bad.status_code, 400)
+
+    def test_internal_errors_are_not_client_errors(self):
+        """ValueError в коде API не превращается в ответ 400"""
+        with mock.patch.object(POST, 'serialize', side_effect=ValueError):
+            with self.assertRaises(ValueError):
+                self.guest_client.get(reverse('api:posts'))
+
+    def test_post_comments_groups(self):
+        """Пост, его комментарии и группы"""
+        post = self.posts[0]
+        detail = self.guest_client.get(
+            reverse('api:post_detail', kwargs={'post_id': post.pk}),
+            {'fields': 'text'})
+        self.assertEqual(detail.json(), {'text': 'Пост 0'})
+        comments = self.guest_client.get(
+            reverse('api:comments', kwargs={'post_id': post.pk}))
+        self.assertEqual(
+            [row['text'] for row in comments.json()['results']],
+            ['Комментарий 0', 'Комментарий 1', 'Комментарий 2'],
+        )
+        groups = self.guest_client.get(reverse('api:groups'))
+        self.assertEqual(groups.json()['results'][0]['posts_count'], 15)
+        missing = self.guest_client.get(
+            reverse('api:post_detail', kwargs={'post_id': 0}))
+        self.assertEqual(missing.status_code, 404)
+
+    def test_follow_feed_requires_login(self):
+        """Лента подписок доступна только после входа"""
+        self.assertEqual(
+            self.guest_client.get(reverse('api:follow')).status_code, 401)
+        response = self.authorized_client.get(reverse('api:follow'))
+        self.assertEqual(len(response.json()['results']), 10)
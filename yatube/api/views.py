@@ -0,0 +1,112 @@
+from functools import wraps
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse
+
+from core.pagination import query_with
+from posts import timeline
+from posts.models import Comment, Group, Post
+from posts.utils import NUM_OF_POSTS, CursorPaginator
+
+from .serializers import COMMENT, GROUP, POST, BadRequest
+
+MAX_LIMIT = 100
+
+
+def respond(data, status=200):
+    return JsonResponse(data, status=status, encoder=DjangoJSONEncoder,
+                        json_dumps_params={'ensure_ascii': False})
+
+
+def error(message, status=400):
+    return respond({'detail': message}, status=status)
+
+
+def limit(request):
+    try:
+        value = int(request.GET.get('limit', NUM_OF_POSTS))
+    except ValueError:
+        raise BadRequest('limit должен быть целым числом')
+    return min(max(value, 1), MAX_LIMIT)
+
+
+def paginated(request, queryset, resource, ordering):
+    '''Страница строк values() с курсорами на соседние страницы'''
+    names = resource.select(request.GET.get('fields'))
+    paginator = CursorPaginator(
+        queryset.values(*resource.paths(names)), limit(request),
+        ordering=ordering,
+    )
+    page = paginator.get_page(
+        request.GET.get('page'),
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    )
+    links = {'next': None, 'previous': None}
+    if page.has_next():
+        links['next'] = '?' + query_with(
+            request.GET, page=page.next_page_number(),
+            after=page.next_cursor)
+    if page.has_previous():
+        links['previous'] = '?' + query_with(
+            request.GET, page=page.previous_page_number(),
+            before=page.previous_cursor)
+    return respond({
+        'results': [resource.serialize(row, names) for row in page],
+        **links,
+    })
+
+
+def api_view(view):
+    '''Отвечает 400 с описанием на ошибки параметров запроса'''
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except BadRequest as exception:
+            return error(str(exception))
+    return wrapper
+
+
+@api_view
+def posts(request):
+    queryset = Post.objects.all()
+    if request.GET.get('group'):
+        queryset = queryset.filter(group__slug=request.GET['group'])
+    if request.GET.get('author'):
+        queryset = queryset.filter(author__username=request.GET['author'])
+    return paginated(request, queryset, POST, ('-pub_date', '-id'))
+
+
+@api_view
+def post_detail(request, post_id):
+    names = POST.select(request.GET.get('fields'))
+    row = Post.objects.filter(pk=post_id).values(*POST.paths(names)).first()
+    if row is None:
+        return error('Пост не найден', status=404)
+    return respond(POST.serialize(row, names))
+
+
+@api_view
+def comments(request, post_id):
+    if not Post.objects.filter(pk=post_id).exists():
+        return error('Пост не найден', status=404)
+    return paginated(request, Comment.objects.filter(post_id=post_id),
+                     COMMENT, ('created', 'id'))
+
+
+@api_view
+def groups(request):
+    names = GROUP.select(request.GET.get('fields'))
+    rows = Group.objects.order_by('title').values(*GROUP.paths(names))
+    return respond({
+        'results': [GROUP.serialize(row, names) for row in rows],
+    })
+
+
+@api_view
+def follow(request):
+    if not request.user.is_authenticated:
+        return error('Требуется вход', status=401)
+    return paginated(request, timeline.feed(request.user), POST,
+                     ('-pub_date', '-id'))
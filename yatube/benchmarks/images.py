@@ -0,0 +1,43 @@
+'''Стоимость обработки одной загруженной картинки'''
+import statistics
+import time
+from io import BytesIO
+
+from django.conf import settings
+from PIL import Image
+
+from posts import images
+
+SIZES = ((640, 480), (1920, 1080), (4032, 3024))
+
+
+def sample(size):
+    '''JPEG «с телефона»: шум не даёт кодеку сжать картинку до нуля'''
+    image = Image.effect_noise(size, 64).convert('RGB')
+    buffer = BytesIO()
+    image.save(buffer, 'JPEG', quality=92)
+    return buffer.getvalue()
+
+
+def measure(data, repeat):
+    args = (tuple(settings.POST_IMAGE_MAX_SIZE),
+            tuple(settings.POST_IMAGE_FORMATS))
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output, extension, _ = images.process(data, *args)
+        timings.append(time.perf_counter() - start)
+    return {
+        'input_kb': round(len(data) / 1024, 1),
+        'output_kb': round(len(output) / 1024, 1),
+        'format': extension,
+        'median_ms': round(statistics.median(timings) * 1000, 1),
+        'max_ms': round(max(timings) * 1000, 1),
+    }
+
+
+def run(repeat, sizes=SIZES):
+    return {
+        f'{width}x{height}': measure(sample((width, height)), repeat)
+        for width, height in sizes
+    }
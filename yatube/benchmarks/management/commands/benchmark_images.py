@@ -0,0 +1,28 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from benchmarks import images, runner
+
+
+class Command(BaseCommand):
+    help = ('Замеряет время обработки загруженной картинки: поворот, '
+            'уменьшение до POST_IMAGE_MAX_SIZE и перекодирование')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--output', default='benchmark-images.json')
+
+    def handle(self, *args, **options):
+        report = {
+            'sizes': images.run(options['repeat']),
+            'commit': runner.git_commit(),
+        }
+        with open(options['output'], 'w') as output:
+            json.dump(report, output, ensure_ascii=False, indent=2)
+        for size, row in report['sizes'].items():
+            self.stdout.write(
+                f'{size:>10} {row["input_kb"]:>8} КБ -> '
+                f'{row["output_kb"]:>8} КБ {row["format"]:4}  '
+                f'медиана {row["median_ms"]} мс  макс. {row["max_ms"]} мс'
+            )
@@ -0,0 +1,35 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from benchmarks import runner, templates
+
+
+class Command(BaseCommand):
+    help = ('Замеряет время отрисовки страниц списка постов без кэша '
+            'шаблонов, с кэширующим загрузчиком и с подстановкой '
+            'включений')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--templates', default='posts/index.html,posts/profile.html',
+            help='Шаблоны через запятую',
+        )
+        parser.add_argument('--renders', type=int, default=200)
+        parser.add_argument('--output', default='benchmark-templates.json')
+
+    def handle(self, *args, **options):
+        report = {
+            'commit': runner.git_commit(),
+            'renders': options['renders'],
+            'ms_per_render': {
+                name: templates.measure(name, options['renders'])
+                for name in options['templates'].split(',')
+            },
+        }
+        with open(options['output'], 'w') as output:
+            json.dump(report, output, ensure_ascii=False, indent=2)
+        for name, timings in report['ms_per_render'].items():
+            self.stdout.write(name + '  ' + '  '.join(
+                f'{variant} {value} мс' for variant, value in timings.items()
+            ))
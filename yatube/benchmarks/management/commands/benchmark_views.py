@@ -0,0 +1,59 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks import runner
+
+
+class Command(BaseCommand):
+    help = ('Замеряет p50/p95 задержки и число SQL-запросов страниц '
+            'posts на разной глубине и пишет результат в JSON')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--depths', default='1,10,100',
+            help='Номера страниц через запятую',
+        )
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument(
+            '--warm', action='store_true',
+            help='Не очищать кэш перед запросами',
+        )
+        parser.add_argument('--output', default='benchmark.json')
+        parser.add_argument(
+            '--compare', metavar='BASELINE',
+            help='JSON прошлого замера: падать, если p95 или число '
+                 'запросов выросли',
+        )
+        parser.add_argument(
+            '--threshold', type=float, default=1.2,
+            help='Допустимый рост p95 относительно BASELINE',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            depths = sorted({int(depth)
+                             for depth in options['depths'].split(',')})
+        except ValueError:
+            raise CommandError('--depths: ожидаются целые числа')
+        report = runner.run(depths, options['repeat'], options['warm'])
+        with open(options['output'], 'w') as output:
+            json.dump(report, output, ensure_ascii=False, indent=2)
+        for row in report['results']:
+            self.stdout.write(
+                f'{row["view"]:20} {row["mode"]:6} {row["depth"]:>5} '
+                f'p50 {row["p50_ms"]:>9.2f} мс  p95 {row["p95_ms"]:>9.2f} мс'
+                f'  запросов {row["queries"]}'
+            )
+        if options['compare']:
+            with open(options['compare']) as baseline:
+                regressions = list(runner.compare(
+                    json.load(baseline), report, options['threshold']))
+            for row, old, ratio in regressions:
+                self.stderr.write(
+                    f'{row["view"]} {row["mode"]} {row["depth"]}: '
+                    f'p95 x{ratio:.2f}, запросов '
+                    f'{old["queries"]} -> {row["queries"]}'
+                )
+            if regressions:
+                raise CommandError('Производительность ухудшилась')
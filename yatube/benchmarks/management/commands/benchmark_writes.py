@@ -0,0 +1,34 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks import runner, writes
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает пропускную способность параллельной записи '
+            'комментариев с настройками SQLite по умолчанию и с '
+            'SQLITE_PRAGMAS')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument(
+            '--comments', type=int, default=50,
+            help='Число комментариев от каждого потока',
+        )
+        parser.add_argument('--output', default='benchmark-writes.json')
+
+    def handle(self, *args, **options):
+        try:
+            report = writes.run(options['threads'], options['comments'])
+        except ValueError as error:
+            raise CommandError(error)
+        report['commit'] = runner.git_commit()
+        with open(options['output'], 'w') as output:
+            json.dump(report, output, ensure_ascii=False, indent=2)
+        for name in ('default', 'tuned'):
+            row = report[name]
+            self.stdout.write(
+                f'{name:8} {row["comments_per_second"]:>8} комм./с  '
+                f'p95 {row["p95_ms"]} мс  ошибок {row["errors"]}'
+            )
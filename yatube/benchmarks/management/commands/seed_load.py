@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from benchmarks.seed import Seeder
+
+
+class Command(BaseCommand):
+    help = ('Заполняет базу синтетическими пользователями, постами, '
+            'подписками и комментариями для замеров производительности. '
+            'Полный набор: --users 100000 --posts 1000000 '
+            '--comments 5000000')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--comments', type=int, default=50000)
+        parser.add_argument('--groups', type=int, default=50)
+        parser.add_argument(
+            '--follows', type=int, default=500,
+            help='Наибольшее число подписок одного пользователя',
+        )
+        parser.add_argument(
+            '--exponent', type=float, default=1.1,
+            help='Показатель степенного распределения популярности',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        seeder = Seeder(
+            users=options['users'],
+            posts=options['posts'],
+            comments=options['comments'],
+            groups=options['groups'],
+            follows=options['follows'],
+            exponent=options['exponent'],
+            seed=options['seed'],
+            log=self.stdout.write,
+        )
+        with transaction.atomic():
+            seeder.run()
+        self.stdout.write(self.style.SUCCESS('Готово'))
@@ -0,0 +1,156 @@
+'''Замеры задержек и числа запросов для страниц приложения posts'''
+import math
+import subprocess
+import time
+
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from posts import timeline
+from posts.models import AuthorStats, Comment, Follow, Group, Post, User
+from posts.utils import NUM_OF_POSTS, encode_cursor
+
+MODES = ('offset', 'cursor')
+
+
+def percentile(values, share):
+    '''Значение по рангу: share доля замеров не больше результата'''
+    ordered = sorted(values)
+    return ordered[max(math.ceil(share * len(ordered)) - 1, 0)]
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def targets():
+    '''Адреса и списки постов для самых тяжёлых объектов каждого вида.
+
+    Для каждой страницы возвращается кортеж (имя, адрес, список или
+    None, пользователь для входа или None).
+    '''
+    found = [('posts:index', reverse('posts:index'), Post.objects, None)]
+    group = Group.objects.order_by('-posts_count').first()
+    if group is not None:
+        found.append((
+            'posts:group_posts',
+            reverse('posts:group_posts', kwargs={'slug': group.slug}),
+            group.posts, None,
+        ))
+    stats = AuthorStats.objects.select_related('user')
+    author = stats.order_by('-posts_count').first()
+    if author is not None:
+        found.append((
+            'posts:profile',
+            reverse('posts:profile',
+                    kwargs={'username': author.user.username}),
+            author.user.posts, None,
+        ))
+    post = Post.objects.annotate(
+        comments_total=Count('comments')).order_by('-comments_total').first()
+    if post is not None:
+        found.append((
+            'posts:post_detail',
+            reverse('posts:post_detail', kwargs={'post_id': post.pk}),
+            None, None,
+        ))
+    reader = stats.order_by('-following_count').first()
+    if reader is not None:
+        found.append((
+            'posts:follow_index', reverse('posts:follow_index'),
+            timeline.feed(reader.user), reader.user,
+        ))
+    return found
+
+
+def page_params(listing, depth, mode):
+    '''Параметры адреса страницы depth в режиме offset или cursor'''
+    if depth == 1:
+        return {}
+    if mode == 'offset':
+        return {'page': depth}
+    offset = (depth - 1) * NUM_OF_POSTS - 1
+    rows = list(listing.order_by('-pub_date', '-id').values_list(
+        'pub_date', 'id')[offset:offset + 1])
+    if not rows:
+        return None
+    return {'page': depth, 'after': encode_cursor(rows[0])}
+
+
+def measure(client, url, params, repeat, warm):
+    timings = []
+    queries = []
+    for _ in range(repeat):
+        if not warm:
+            cache.clear()
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            response = client.get(url, params)
+            timings.append(time.perf_counter() - start)
+        queries.append(len(captured))
+        if response.status_code != 200:
+            raise RuntimeError(f'{url} {params}: {response.status_code}')
+    return {
+        'p50_ms': round(percentile(timings, 0.5) * 1000, 3),
+        'p95_ms': round(percentile(timings, 0.95) * 1000, 3),
+        'queries': max(queries),
+    }
+
+
+def dataset():
+    return {
+        'users': User.objects.count(),
+        'posts': Post.objects.count(),
+        'comments': Comment.objects.count(),
+        'follows': Follow.objects.count(),
+    }
+
+
+def run(depths, repeat, warm=False):
+    results = []
+    for view, url, listing, user in targets():
+        client = Client()
+        if user is not None:
+            client.force_login(user)
+        for depth in (depths if listing is not None else (1,)):
+            for mode in (MODES if depth > 1 else MODES[:1]):
+                params = page_params(listing, depth, mode)
+                if params is None:
+                    continue
+                result = {'view': view, 'depth': depth, 'mode': mode}
+                result.update(measure(client, url, params, repeat, warm))
+                results.append(result)
+    return {
+        'commit': git_commit(),
+        'created': timezone.now().isoformat(),
+        'repeat': repeat,
+        'warm_cache': warm,
+        'dataset': dataset(),
+        'results': results,
+    }
+
+
+def compare(baseline, current, threshold):
+    '''Строки, где p95 выросла больше чем в threshold раз'''
+    before = {
+        (row['view'], row['depth'], row['mode']): row
+        for row in baseline['results']
+    }
+    for row in current['results']:
+        old = before.get((row['view'], row['depth'], row['mode']))
+        if old is None or not old['p95_ms']:
+            continue
+        ratio = row['p95_ms'] / old['p95_ms']
+        if ratio > threshold or row['queries'] > old['queries']:
+            yield row, old, ratio
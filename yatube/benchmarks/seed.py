@@ -0,0 +1,171 @@
+'''Генератор синтетических данных для замеров производительности.
+
+Записи создаются пачками через bulk_create, поэтому сигналы не
+срабатывают: счётчики, ленты подписок и поисковый индекс
+заполняются отдельными шагами после вставки.
+'''
+import random
+from datetime import timedelta
+from itertools import accumulate, islice
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.utils import timezone
+from faker import Faker
+
+from posts import counters, timeline
+from posts.bulk import explicit_dates
+from posts.models import Comment, Follow, Group, Post, User
+from posts.search import get_backend
+
+BATCH_SIZE = 500
+CHUNK_SIZE = 20000
+PHRASES = 1000
+PERIOD = timedelta(days=365 * 3)
+
+
+def zipf_weights(count, exponent):
+    '''Накопленные веса степенного распределения по рангам 1..count'''
+    return list(accumulate(1 / rank ** exponent
+                           for rank in range(1, count + 1)))
+
+
+class Seeder:
+    def __init__(self, users, posts, comments, groups, follows,
+                 exponent=1.1, seed=0, log=print):
+        self.sizes = {
+            'users': users,
+            'posts': posts,
+            'comments': comments,
+            'groups': groups,
+            'follows': follows,
+        }
+        self.exponent = exponent
+        self.random = random.Random(seed)
+        self.faker = Faker('ru_RU')
+        self.faker.seed_instance(seed)
+        self.log = log
+        self.now = timezone.now()
+
+    def users(self):
+        return User.objects.filter(username__startswith='seed')
+
+    def text(self, words):
+        return ' '.join(self.random.choices(self.phrases, k=words))
+
+    def date(self):
+        return self.now - PERIOD * self.random.random()
+
+    def insert(self, model, objects):
+        '''Вставляет объекты порциями, не собирая их все в памяти'''
+        objects = iter(objects)
+        while True:
+            chunk = list(islice(objects, CHUNK_SIZE))
+            if not chunk:
+                return
+            model.objects.bulk_create(chunk, batch_size=BATCH_SIZE,
+                                      ignore_conflicts=True)
+
+    def popular(self, ids, count):
+        '''count случайных id; чем раньше id в списке, тем он чаще'''
+        if len(ids) not in self.weights:
+            self.weights[len(ids)] = zipf_weights(len(ids), self.exponent)
+        return self.random.choices(ids, cum_weights=self.weights[len(ids)],
+                                   k=count)
+
+    def seed_users(self):
+        start = self.users().count()
+        password = make_password(None)
+        self.insert(User, (
+            User(username=f'seed{start + number}', password=password,
+                 first_name=self.faker.first_name(),
+                 last_name=self.faker.last_name())
+            for number in range(self.sizes['users'])
+        ))
+        return list(self.users().values_list('pk', flat=True))
+
+    def seed_groups(self):
+        start = Group.objects.filter(slug__startswith='seed-').count()
+        self.insert(Group, (
+            Group(title=self.faker.catch_phrase()[:200],
+                  slug=f'seed-{start + number}',
+                  description=self.text(5))
+            for number in range(self.sizes['groups'])
+        ))
+        return list(Group.objects.filter(
+            slug__startswith='seed-').values_list('pk', flat=True))
+
+    def seed_posts(self, users, groups):
+        authors = self.popular(users, self.sizes['posts'])
+        with explicit_dates(Post._meta.get_field('pub_date')):
+            self.insert(Post, (
+                Post(author_id=author_id,
+                     group_id=(self.random.choice(groups)
+                               if groups and self.random.random() < 0.5
+                               else None),
+                     text=self.text(self.random.randint(3, 30)),
+                     pub_date=self.date())
+                for author_id in authors
+            ))
+        return list(Post.objects.filter(
+            author__in=self.users()).values_list('pk', flat=True))
+
+    def seed_follows(self, users):
+        '''Каждый читатель подписан на популярных авторов чаще'''
+        def follows():
+            for user_id in users:
+                count = min(int(self.random.paretovariate(1.5)),
+                            self.sizes['follows'], len(users) - 1)
+                for author_id in set(self.popular(users, count)):
+                    if author_id != user_id:
+                        yield Follow(user_id=user_id, author_id=author_id)
+        self.insert(Follow, follows())
+
+    def seed_comments(self, users, posts):
+        post_ids = self.popular(posts, self.sizes['comments'])
+        with explicit_dates(Comment._meta.get_field('created')):
+            self.insert(Comment, (
+                Comment(post_id=post_id,
+                        author_id=self.random.choice(users),
+                        text=self.text(self.random.randint(1, 10)),
+                        created=self.date())
+                for post_id in post_ids
+            ))
+
+    def fill_timelines(self):
+        Post.objects.filter(
+            author__in=self.users(),
+            author__stats__followers_count__gte=(
+                settings.TIMELINE_CELEBRITY_FOLLOWERS),
+        ).update(fanned_out=False)
+        follows = Follow.objects.filter(user__in=self.users()).values_list(
+            'user_id', 'author_id').iterator()
+        for user_id, author_id in follows:
+            timeline.write_backfill(user_id, [author_id])
+
+    def fill_search(self):
+        backend = get_backend()
+        posts = Post.objects.filter(author__in=self.users()).only(
+            'pk', 'text').iterator()
+        for post in posts:
+            backend.index(post)
+
+    def run(self):
+        self.phrases = [self.faker.sentence() for _ in range(PHRASES)]
+        self.weights = {}
+        self.log('Пользователи…')
+        users = self.seed_users()
+        self.log('Группы…')
+        groups = self.seed_groups()
+        self.log('Посты…')
+        posts = self.seed_posts(users, groups)
+        self.log('Подписки…')
+        self.seed_follows(users)
+        self.log('Комментарии…')
+        self.seed_comments(users, posts)
+        self.log('Счётчики…')
+        counters.reconcile()
+        self.log('Ленты подписок…')
+        self.fill_timelines()
+        self.log('Поисковый индекс…')
+        self.fill_search()
@@ -0,0 +1,66 @@
+'''Время отрисовки страницы списка постов с разными загрузчиками'''
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.paginator import Paginator
+from django.template import RequestContext
+from django.template.backends.django import DjangoTemplates
+from django.test import RequestFactory
+from django.utils import timezone
+
+from posts.models import Group, Post, User
+from posts.utils import NUM_OF_POSTS
+
+PLAIN = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+VARIANTS = {
+    'plain': PLAIN,
+    'cached': [('django.template.loaders.cached.Loader', PLAIN)],
+    'cached_inlined': [
+        ('django.template.loaders.cached.Loader', [
+            ('core.loaders.Loader', PLAIN),
+        ]),
+    ],
+}
+
+
+def engine(loaders):
+    '''Шаблонизатор проекта с заданными загрузчиками'''
+    options = settings.TEMPLATES[0]
+    return DjangoTemplates({
+        'NAME': 'benchmark',
+        'DIRS': options['DIRS'],
+        'APP_DIRS': False,
+        'OPTIONS': dict(options['OPTIONS'], loaders=loaders),
+    }).engine
+
+
+def page():
+    '''Страница из несохранённых постов: замер не зависит от базы'''
+    author = User(pk=1, username='author')
+    group = Group(pk=1, slug='group', title='Группа')
+    posts = [
+        Post(pk=number, author=author, group=group,
+             text=f'Текст поста {number} ' * 20, pub_date=timezone.now())
+        for number in range(1, NUM_OF_POSTS + 1)
+    ]
+    return Paginator(posts, NUM_OF_POSTS).page(1)
+
+
+def measure(template_name, renders):
+    request = RequestFactory().get('/')
+    request.user = AnonymousUser()
+    context = {'page_obj': page()}
+    report = {}
+    for name, loaders in VARIANTS.items():
+        template_engine = engine(loaders)
+        start = time.perf_counter()
+        for _ in range(renders):
+            template = template_engine.get_template(template_name)
+            template.render(RequestContext(request, context))
+        elapsed = time.perf_counter() - start
+        report[name] = round(elapsed / renders * 1000, 3)
+    return report
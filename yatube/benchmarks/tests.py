@@ -0,0 +1,36 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from posts.models import Comment, Follow, Post, TimelineEntry
+from posts.search import search_posts
+
+
+class BenchmarkCommandsTest(TestCase):
+    def test_seed_and_benchmark(self):
+        """Набор данных создаётся, замеры пишутся в JSON."""
+        call_command('seed_load', users=20, posts=200, comments=300,
+                     groups=3, stdout=StringIO())
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertEqual(Comment.objects.count(), 300)
+        self.assertTrue(Follow.objects.exists())
+        self.assertTrue(TimelineEntry.objects.exists())
+        word = Post.objects.first().text.split()[0]
+        self.assertGreater(search_posts(word).count(), 0)
+
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'result.json')
+            call_command('benchmark_views', depths='1,2', repeat=2,
+                         output=output, stdout=StringIO())
+            with open(output) as result:
+                report = json.load(result)
+        views = {row['view'] for row in report['results']}
+        self.assertEqual(views, {
+            'posts:index', 'posts:group_posts', 'posts:profile',
+            'posts:post_detail', 'posts:follow_index',
+        })
+        self.assertEqual(report['dataset']['posts'], 200)
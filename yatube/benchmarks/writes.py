@@ -0,0 +1,85 @@
+'''Пропускная способность записи комментариев из нескольких потоков'''
+import threading
+import time
+
+from django.conf import settings
+from django.db import OperationalError, connection, connections
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from posts.models import Post, User
+
+# Значения SQLite по умолчанию, с которыми сравниваются SQLITE_PRAGMAS
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'DELETE',
+    'synchronous': 'FULL',
+    'mmap_size': 0,
+    'cache_size': -2000,
+    'busy_timeout': 5000,
+}
+
+
+def post_comments(url, user, count, latencies, errors):
+    client = Client()
+    client.force_login(user)
+    try:
+        for number in range(count):
+            start = time.perf_counter()
+            try:
+                response = client.post(url, {'text': f'Комментарий {number}'})
+            except OperationalError:
+                errors.append('locked')
+                continue
+            if response.status_code != 302:
+                errors.append(response.status_code)
+            else:
+                latencies.append(time.perf_counter() - start)
+    finally:
+        connection.close()
+
+
+def measure(post, users, count):
+    url = reverse('posts:add_comment', kwargs={'post_id': post.pk})
+    latencies = []
+    errors = []
+    threads = [
+        threading.Thread(target=post_comments,
+                         args=(url, user, count, latencies, errors))
+        for user in users
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        'threads': len(users),
+        'comments': len(latencies),
+        'errors': len(errors),
+        'seconds': round(elapsed, 3),
+        'comments_per_second': round(len(latencies) / elapsed, 1),
+        'p95_ms': round(
+            latencies[int(len(latencies) * 0.95) - 1] * 1000, 3
+        ) if latencies else None,
+    }
+
+
+def run(threads, count):
+    '''Замеряет запись с настройками SQLite по умолчанию и с SQLITE_PRAGMAS'''
+    post = Post.objects.order_by('-pk').first()
+    if post is None:
+        raise ValueError('Нет постов: сначала выполните seed_load')
+    users = list(User.objects.order_by('pk')[:threads])
+    report = {}
+    variants = (
+        ('default', DEFAULT_PRAGMAS),
+        ('tuned', settings.SQLITE_PRAGMAS),
+    )
+    for name, pragmas in variants:
+        with override_settings(SQLITE_PRAGMAS=pragmas):
+            connections.close_all()
+            report[name] = measure(post, users, count)
+    connections.close_all()
+    return report
@@ -0,0 +1,20 @@
+from django.contrib import admin
+
+from .models import StoredFile, Task
+
+
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'name', 'status', 'attempts', 'run_at', 'created')
+    list_filter = ('status', 'name')
+    empty_value_display = '-пусто-'
+
+
+admin.site.register(Task, TaskAdmin)
+
+
+class StoredFileAdmin(admin.ModelAdmin):
+    list_display = ('name', 'references')
+    search_fields = ('name',)
+
+
+admin.site.register(StoredFile, StoredFileAdmin)
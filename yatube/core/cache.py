@@ -0,0 +1,159 @@
+import hashlib
+import time
+from functools import wraps
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from .db import state
+from .metrics import record_cache
+
+
+def generation_key(name):
+    return f'generation:{quote(name)}'
+
+
+def now_generation():
+    return time.time_ns() // 1000
+
+
+def generations(names):
+    '''Текущие поколения по именам; отсутствующие заводятся заново.
+
+    Поколение — отметка времени в микросекундах, поэтому вытесненный
+    из кэша счётчик не может вернуться к значению, под которым уже
+    лежат сохранённые страницы.
+    '''
+    keys = {generation_key(name): name for name in names}
+    found = cache.get_many(keys)
+    missing = {key: now_generation() for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, None)
+        found.update(missing)
+    return {keys[key]: value for key, value in found.items()}
+
+
+def bump(*names):
+    '''Сдвигает поколения, делая устаревшими все зависящие от них ключи.
+
+    Сдвиг повторяется после фиксации транзакции: страница, собранная
+    другим запросом до фиксации, иначе осталась бы в кэше устаревшей.
+    '''
+    def shift():
+        value = now_generation()
+        cache.set_many({generation_key(name): value for name in names}, None)
+    shift()
+    transaction.on_commit(shift)
+
+
+def viewer(request):
+    '''Часть ключа, различающая анонимов и конкретных пользователей'''
+    if not request.user.is_authenticated:
+        return 'anon'
+    csrf = request.COOKIES.get(settings.CSRF_COOKIE_NAME, '')
+    return f'user:{request.user.pk}:{csrf}'
+
+
+def page_key(request, view_name, kwargs, versions):
+    parts = [
+        view_name,
+        repr(sorted(kwargs.items())),
+        request.GET.urlencode(),
+        viewer(request),
+        repr(sorted(versions.items())),
+    ]
+    digest = hashlib.md5('|'.join(parts).encode()).hexdigest()
+    return f'page:{view_name}:{digest}'
+
+
+def process_local():
+    '''Хранит ли кэш данные в памяти процесса.
+
+    Сдвиги поколений из других процессов до такого кэша не доходят,
+    поэтому страницы в нём живут недолго и не получают валидаторов:
+    ответ 304 по старому ETag держал бы у клиента устаревшую страницу.
+    '''
+    return isinstance(caches['default'], LocMemCache)
+
+
+def page_timeout():
+    if process_local():
+        return settings.PAGE_CACHE_LOCAL_TIMEOUT
+    return settings.PAGE_CACHE_TIMEOUT
+
+
+def validators(key, versions):
+    '''ETag и Last-Modified страницы из её ключа и поколений.
+
+    Last-Modified точен до секунды, поэтому пока идёт секунда последнего
+    изменения, он не выдаётся: следующее изменение в ту же секунду
+    получило бы ту же дату, и If-Modified-Since ответил бы 304 на уже
+    другую страницу. Такие ответы проверяются только по ETag.
+    '''
+    if process_local():
+        return None, None
+    etag = quote_etag(key.rsplit(':', 1)[1])
+    last_modified = max(versions.values()) // 10 ** 6
+    if last_modified >= now_generation() // 10 ** 6:
+        last_modified = None
+    return etag, last_modified
+
+
+def set_validators(response, etag, last_modified):
+    if etag is not None:
+        response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+def cache_page_versioned(scopes):
+    '''Кэширует ответ представления до сдвига любого из его поколений.
+
+    scopes(request, **kwargs) возвращает имена поколений, от которых
+    зависит страница, или None, если страницу кэшировать не нужно.
+    Те же поколения дают ETag и Last-Modified: на условный запрос
+    с совпавшим валидатором отвечает 304 без выборки и отрисовки.
+
+    Страница для кэша собирается по основной базе: отставшая реплика
+    отдала бы данные до сдвига поколения, и устаревшая страница легла
+    бы в кэш под новым ключом на весь PAGE_CACHE_TIMEOUT.
+    '''
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            names = None
+            if request.method == 'GET':
+                names = scopes(request, **kwargs)
+            if names is None:
+                return view(request, *args, **kwargs)
+            versions = generations(names)
+            key = page_key(request, view.__name__, kwargs, versions)
+            etag, last_modified = validators(key, versions)
+            response = get_conditional_response(
+                request, etag=etag, last_modified=last_modified)
+            if response is not None:
+                return set_validators(response, etag, last_modified)
+            response = cache.get(key)
+            record_cache(response is not None)
+            if response is not None:
+                return set_validators(response, etag, last_modified)
+            state.use_primary = True
+            response = view(request, *args, **kwargs)
+            new_csrf_cookie = (
+                request.META.get('CSRF_COOKIE_USED')
+                and settings.CSRF_COOKIE_NAME not in request.COOKIES
+            )
+            if response.status_code != 200:
+                return response
+            set_validators(response, etag, last_modified)
+            if not new_csrf_cookie:
+                cache.set(key, response, page_timeout())
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,112 @@
+import random
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+STICKY_KEY = 'primary_db_until'
+PRIMARY_ONLY_APPS = {'sessions', 'core'}
+
+
+class State(threading.local):
+    '''Куда читать в текущем потоке и были ли записи.
+
+    Вне запросов (команды, фоновые задачи) чтение идёт с основной
+    базы: там данные читаются, чтобы тут же быть изменёнными.
+    '''
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self, use_primary=True):
+        self.use_primary = use_primary
+        self.wrote = False
+
+
+state = State()
+
+
+def use_primary(view):
+    '''Помечает представление, которое пишет в базу даже на GET'''
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        return view(request, *args, **kwargs)
+    wrapper.use_primary = True
+    return wrapper
+
+
+class ReplicaRouter:
+    '''Читает с реплик, пишет в основную базу.
+
+    После первой записи в запросе чтение до его конца тоже идёт
+    с основной базы, чтобы запрос видел свои изменения. Сессии и очередь
+    задач всегда читаются с основной базы: отставшая реплика потеряла
+    бы только что созданную сессию или задачу.
+    '''
+
+    def db_for_read(self, model, **hints):
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        if (state.use_primary or state.wrote
+                or not settings.DATABASE_REPLICAS
+                or model._meta.app_label in PRIMARY_ONLY_APPS):
+            return DEFAULT_DB_ALIAS
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+class ReplicaMiddleware:
+    '''Отправляет безопасные запросы на реплики.
+
+    После записи сессия REPLICA_STICKY_SECONDS секунд читает с основной
+    базы, чтобы автор сразу видел свой пост, пока реплики догоняют.
+    '''
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def sticky(self, request):
+        session = getattr(request, 'session', None)
+        return (session is not None
+                and session.get(STICKY_KEY, 0) > time.time())
+
+    def __call__(self, request):
+        state.reset(use_primary=(
+            request.method not in SAFE_METHODS or self.sticky(request)))
+        try:
+            response = self.get_response(request)
+            wrote = state.wrote
+        finally:
+            state.reset()
+        if wrote and hasattr(request, 'session'):
+            request.session[STICKY_KEY] = (
+                time.time() + settings.REPLICA_STICKY_SECONDS)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if getattr(view_func, 'use_primary', False):
+            state.use_primary = True
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    '''Применяет SQLITE_PRAGMAS к каждому новому соединению SQLite'''
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
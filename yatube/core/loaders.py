@@ -0,0 +1,56 @@
+import re
+
+from django.template import TemplateDoesNotExist
+from django.template.loaders.base import Loader as BaseLoader
+
+INCLUDE = re.compile(
+    r'''{%\s*include\s+(?P<quote>['"])(?P<name>[^'"]+)(?P=quote)\s*%}''')
+NOT_INLINABLE = re.compile(r'{%\s*(extends|block)\b')
+MAX_DEPTH = 10
+
+
+class Loader(BaseLoader):
+    '''Подставляет текст шаблонов из {% include 'имя' %} на место тега.
+
+    Шаблон в цикле по постам иначе выполняет узел include для каждого
+    поста. Подставляются только включения с именем-строкой без with и
+    only и без собственных extends и block: для них результат
+    отрисовки совпадает. Загрузчик оборачивает обычные загрузчики и
+    сам оборачивается кэширующим, поэтому подстановка выполняется
+    один раз на процесс.
+    '''
+
+    def __init__(self, engine, loaders):
+        super().__init__(engine)
+        self.loaders = engine.get_template_loaders(loaders)
+
+    def get_template_sources(self, template_name):
+        for loader in self.loaders:
+            yield from loader.get_template_sources(template_name)
+
+    def source(self, template_name):
+        for origin in self.get_template_sources(template_name):
+            try:
+                return origin.loader.get_contents(origin)
+            except TemplateDoesNotExist:
+                continue
+        raise TemplateDoesNotExist(template_name)
+
+    def inline(self, contents, depth=0):
+        def replace(match):
+            try:
+                included = self.source(match.group('name'))
+            except TemplateDoesNotExist:
+                return match.group(0)
+            if NOT_INLINABLE.search(included) or depth >= MAX_DEPTH:
+                return match.group(0)
+            return self.inline(included, depth + 1)
+        return INCLUDE.sub(replace, contents)
+
+    def get_contents(self, origin):
+        return self.inline(origin.loader.get_contents(origin))
+
+    def reset(self):
+        for loader in self.loaders:
+            if hasattr(loader, 'reset'):
+                loader.reset()
@@ -0,0 +1,63 @@
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from core import tasks
+
+
+class Command(BaseCommand):
+    help = 'Выполняет фоновые задачи из очереди в нескольких потоках'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=settings.TASKS_WORKERS,
+            help='Число параллельных обработчиков',
+        )
+        parser.add_argument(
+            '--poll', type=float, default=1.0,
+            help='Пауза между проверками пустой очереди, секунд',
+        )
+        parser.add_argument(
+            '--burst', action='store_true',
+            help='Завершиться, когда очередь опустеет',
+        )
+
+    def work(self, stop, poll, burst):
+        try:
+            while not stop.is_set():
+                close_old_connections()
+                job = tasks.claim()
+                if job is None:
+                    if burst:
+                        return
+                    stop.wait(poll)
+                    continue
+                task_id = job.pk
+                ok = tasks.execute(job)
+                self.stdout.write(
+                    f'{"OK" if ok else "ERROR"} {job.name} #{task_id}')
+        finally:
+            connection.close()
+
+    def handle(self, *args, **options):
+        stop = threading.Event()
+        workers = [
+            threading.Thread(
+                target=self.work,
+                args=(stop, options['poll'], options['burst']),
+                name=f'worker-{number}',
+            )
+            for number in range(options['workers'])
+        ]
+        for worker in workers:
+            worker.start()
+        try:
+            for worker in workers:
+                while worker.is_alive():
+                    worker.join(0.5)
+        except KeyboardInterrupt:
+            stop.set()
+            for worker in workers:
+                worker.join()
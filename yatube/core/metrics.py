@@ -0,0 +1,234 @@
+import bisect
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import DjangoTemplates
+
+logger = logging.getLogger(__name__)
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+UNRESOLVED = '<unresolved>'
+
+local = threading.local()
+
+
+class Sample:
+    '''Замеры одного запроса'''
+
+    def __init__(self):
+        self.queries = 0
+        self.query_time = 0.0
+        self.render_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        '''Обёртка выполнения SQL для connection.execute_wrapper'''
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.query_time += time.perf_counter() - start
+            self.queries += 1
+
+
+def current():
+    return getattr(local, 'sample', None)
+
+
+def record_cache(hit):
+    '''Отмечает попадание или промах кэша в замерах текущего запроса'''
+    sample = current()
+    if sample is None:
+        return
+    if hit:
+        sample.cache_hits += 1
+    else:
+        sample.cache_misses += 1
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    @property
+    def count(self):
+        return sum(self.counts)
+
+
+class ViewStats:
+    def __init__(self):
+        self.duration = Histogram(BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.query_time = 0.0
+        self.render_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.over_budget = 0
+
+
+class Registry:
+    '''Накопленные замеры по именам представлений.
+
+    Данные живут в памяти процесса: каждый процесс сервера отдаёт
+    на /metrics свои значения, суммирует их сборщик метрик.
+    '''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = defaultdict(ViewStats)
+
+    def observe(self, view, duration, sample, over_budget):
+        with self.lock:
+            stats = self.views[view]
+            stats.duration.observe(duration)
+            stats.queries.observe(sample.queries)
+            stats.query_time += sample.query_time
+            stats.render_time += sample.render_time
+            stats.cache_hits += sample.cache_hits
+            stats.cache_misses += sample.cache_misses
+            stats.over_budget += int(over_budget)
+
+    def clear(self):
+        with self.lock:
+            self.views.clear()
+
+    def render(self):
+        '''Текст в формате экспозиции Prometheus'''
+        lines = []
+        with self.lock:
+            views = sorted(self.views.items())
+            histograms = (
+                ('yatube_request_duration_seconds',
+                 'Wall time of a request.', 'duration'),
+                ('yatube_request_queries',
+                 'SQL queries per request.', 'queries'),
+            )
+            for name, help_text, attr in histograms:
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} histogram')
+                for view, stats in views:
+                    lines.extend(histogram_lines(
+                        name, view, getattr(stats, attr)))
+            counters = (
+                ('yatube_request_query_seconds_total',
+                 'Time spent in SQL queries.', 'query_time'),
+                ('yatube_request_render_seconds_total',
+                 'Time spent rendering templates.', 'render_time'),
+                ('yatube_cache_hits_total',
+                 'Cache lookups that hit.', 'cache_hits'),
+                ('yatube_cache_misses_total',
+                 'Cache lookups that missed.', 'cache_misses'),
+                ('yatube_request_over_budget_total',
+                 'Requests that exceeded the view budget.', 'over_budget'),
+            )
+            for name, help_text, attr in counters:
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} counter')
+                for view, stats in views:
+                    lines.append(
+                        f'{name}{{view="{label(view)}"}} '
+                        f'{getattr(stats, attr)}')
+        return '\n'.join(lines) + '\n'
+
+
+def label(value):
+    return (value.replace('\\', '\\\\').replace('"', '\\"')
+            .replace('\n', '\\n'))
+
+
+def histogram_lines(name, view, histogram):
+    view = label(view)
+    total = 0
+    for bound, count in zip(histogram.buckets, histogram.counts):
+        total += count
+        yield f'{name}_bucket{{view="{view}",le="{bound}"}} {total}'
+    yield f'{name}_bucket{{view="{view}",le="+Inf"}} {histogram.count}'
+    yield f'{name}_sum{{view="{view}"}} {histogram.sum}'
+    yield f'{name}_count{{view="{view}"}} {histogram.count}'
+
+
+registry = Registry()
+
+
+def over_budget(view, duration, sample):
+    '''Сравнивает замеры с VIEW_BUDGETS и пишет предупреждение'''
+    budget = settings.VIEW_BUDGETS.get(view)
+    if budget is None:
+        return False
+    exceeded = []
+    if 'queries' in budget and sample.queries > budget['queries']:
+        exceeded.append(f'{sample.queries} queries > {budget["queries"]}')
+    if 'time' in budget and duration > budget['time']:
+        exceeded.append(f'{duration:.3f}s > {budget["time"]}s')
+    if exceeded:
+        logger.warning('View %s over budget: %s', view, ', '.join(exceeded))
+    return bool(exceeded)
+
+
+class MetricsMiddleware:
+    '''Замеряет время запроса, SQL, отрисовку шаблонов и работу кэша.
+
+    Должна стоять первой в MIDDLEWARE, чтобы учитывать работу
+    остальных промежуточных слоёв.
+    '''
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        sample = local.sample = Sample()
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(sample))
+                response = self.get_response(request)
+        finally:
+            local.sample = None
+        duration = time.perf_counter() - start
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else UNRESOLVED
+        registry.observe(view, duration, sample,
+                         over_budget(view, duration, sample))
+        return response
+
+
+class TimedTemplate:
+    def __init__(self, template):
+        self.wrapped = template
+
+    def __getattr__(self, name):
+        return getattr(self.wrapped, name)
+
+    def render(self, context=None, request=None):
+        sample = current()
+        if sample is None:
+            return self.wrapped.render(context, request)
+        start = time.perf_counter()
+        try:
+            return self.wrapped.render(context, request)
+        finally:
+            sample.render_time += time.perf_counter() - start
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    '''Шаблонизатор Django, учитывающий время отрисовки в замерах'''
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
@@ -0,0 +1,14 @@
+'''Параметры пагинации в строке запроса для шаблонов и API'''
+
+PAGINATION_PARAMS = ('page', 'after', 'before')
+
+
+def query_with(query, **params):
+    '''Строка запроса query с заменой параметров пагинации на params'''
+    query = query.copy()
+    for name in PAGINATION_PARAMS:
+        query.pop(name, None)
+    for name, value in params.items():
+        if value:
+            query[name] = value
+    return query.urlencode()
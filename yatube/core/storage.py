@@ -0,0 +1,87 @@
+import hashlib
+import logging
+import os
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import FileSystemStorage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils.deconstruct import deconstructible
+
+from .models import StoredFile
+
+logger = logging.getLogger(__name__)
+
+
+@deconstructible
+class HashedStorage(FileSystemStorage):
+    '''Файлы именуются sha256 содержимого и раскладываются по каталогам.
+
+    posts/photo.jpg сохраняется как posts/ab/cd/abcd….jpg: в каждом
+    каталоге не больше 256 записей, а одинаковые загрузки попадают
+    в один файл. Сколько записей ссылается на файл, учитывают acquire()
+    и release(); файл удаляется, когда ссылок не остаётся.
+    '''
+
+    def hashed_name(self, name, content):
+        digest = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        digest = digest.hexdigest()
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        return os.path.join(directory, digest[:2], digest[2:4],
+                            digest + extension)
+
+    def _save(self, name, content):
+        name = self.hashed_name(name, content)
+        if self.exists(name):
+            # Свежая дата изменения защищает файл от очистки медиа,
+            # пока ссылающийся на него пост не зафиксирован.
+            os.utime(self.path(name))
+            return name
+        saved = super()._save(name, content)
+        if saved != name:
+            # Тот же файл одновременно записал другой запрос.
+            self.delete(saved)
+        return name
+
+
+def acquire(*names):
+    '''Добавляет по ссылке на каждый файл из names'''
+    for name in names:
+        updated = StoredFile.objects.filter(name=name).update(
+            references=F('references') + 1)
+        if updated:
+            continue
+        try:
+            with transaction.atomic():
+                StoredFile.objects.create(name=name, references=1)
+        except IntegrityError:
+            StoredFile.objects.filter(name=name).update(
+                references=F('references') + 1)
+
+
+def release(storage, *names):
+    '''Снимает по ссылке и после фиксации удаляет файлы без ссылок'''
+    for name in names:
+        StoredFile.objects.filter(name=name, references__gt=0).update(
+            references=F('references') - 1)
+        deleted, _ = StoredFile.objects.filter(
+            name=name, references=0).delete()
+        if deleted:
+            transaction.on_commit(
+                lambda name=name: delete_unreferenced(storage, name))
+
+
+def delete_unreferenced(storage, name):
+    '''Удаляет файл, если на него не успели сослаться заново'''
+    if StoredFile.objects.filter(name=name).exists():
+        return
+    try:
+        storage.delete(name)
+    except (OSError, SuspiciousFileOperation) as error:
+        # Данные уже зафиксированы, ошибка не должна сорвать ответ.
+        logger.warning('Не удалось удалить %s: %s', name, error)
@@ -0,0 +1,95 @@
+import json
+import logging
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+
+def task(max_attempts=3):
+    '''Делает функцию фоновой задачей: func.delay(*args) ставит её в очередь.
+
+    Задача записывается в базу в той же транзакции, что и данные, которые
+    её породили, поэтому обработчик увидит её только после фиксации.
+    Аргументы должны сериализоваться в JSON.
+    '''
+    def decorator(func):
+        name = f'{func.__module__}.{func.__name__}'
+
+        def delay(*args):
+            if settings.TASKS_ALWAYS_EAGER:
+                return func(*args)
+            return Task.objects.create(
+                name=name,
+                args=json.dumps(args),
+                max_attempts=max_attempts,
+            )
+
+        func.delay = delay
+        return func
+    return decorator
+
+
+def claim():
+    '''Забирает одну готовую задачу; None, если очередь пуста.
+
+    Зависшая задача (её обработчик умер) забирается заново и считается
+    неудачной попыткой, поэтому задача, убивающая обработчик, после
+    max_attempts переходит в DEAD, а не повторяется бесконечно.
+    Условие обновления включает прочитанный locked_at, так что зависшую
+    задачу забирает только один обработчик.
+    '''
+    now = timezone.now()
+    stale = now - timedelta(seconds=settings.TASKS_LOCK_TIMEOUT)
+    ready = Task.objects.filter(
+        Q(status=Task.QUEUED, run_at__lte=now)
+        | Q(status=Task.RUNNING, locked_at__lt=stale)
+    ).order_by('run_at', 'pk')
+    rows = ready.values_list('pk', 'status', 'locked_at', 'attempts',
+                             'max_attempts')[:10]
+    for task_id, status, locked_at, attempts, max_attempts in rows:
+        current = Task.objects.filter(pk=task_id, status=status,
+                                      locked_at=locked_at)
+        if status == Task.QUEUED:
+            claimed = current.update(status=Task.RUNNING, locked_at=now)
+        elif attempts + 1 >= max_attempts:
+            if current.update(status=Task.DEAD, locked_at=None,
+                              attempts=F('attempts') + 1,
+                              error='Обработчик задачи не завершился'):
+                logger.error('Задача %s не выполнена: обработчик не '
+                             'завершился %s раз', task_id, attempts + 1)
+            continue
+        else:
+            claimed = current.update(locked_at=now,
+                                     attempts=F('attempts') + 1)
+        if claimed:
+            return Task.objects.get(pk=task_id)
+    return None
+
+
+def execute(job):
+    '''Выполняет задачу; при ошибке откладывает её или переводит в DEAD'''
+    try:
+        import_string(job.name)(*json.loads(job.args))
+    except Exception:
+        job.attempts += 1
+        job.error = traceback.format_exc()
+        job.locked_at = None
+        if job.attempts >= job.max_attempts:
+            job.status = Task.DEAD
+            logger.error('Задача %s не выполнена: %s', job.pk, job.error)
+        else:
+            job.status = Task.QUEUED
+            delay = settings.TASKS_RETRY_DELAY * 2 ** (job.attempts - 1)
+            job.run_at = timezone.now() + timedelta(seconds=delay)
+        job.save()
+        return False
+    job.delete()
+    return True
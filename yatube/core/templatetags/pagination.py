@@ -0,0 +1,11 @@
+from django import template
+
+from core.pagination import query_with
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def page_query(context, **params):
+    '''Строка запроса текущей страницы с новыми параметрами пагинации'''
+    return query_with(context['request'].GET, **params)
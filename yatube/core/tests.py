@@ -1,6 +1,41 @@
+import shutil
+import tempfile
+from datetime import timedelta
 from http import HTTPStatus
+from io import StringIO
 
-from django.test import TestCase
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.template import Context, Engine
+from django.test import (RequestFactory, TestCase, TransactionTestCase,
+                         override_settings)
+from django.urls import reverse
+from django.utils import timezone
+
+from posts.models import Post
+
+from .cache import cache_page_versioned
+from .db import ReplicaMiddleware, ReplicaRouter, use_primary
+from .metrics import registry
+from .models import StoredFile, Task
+from .storage import HashedStorage
+from .tasks import claim, execute, task
+
+
+@task()
+def remember(value):
+    cache.set('remembered', value)
+
+
+@task(max_attempts=2)
+def explode():
+    raise RuntimeError('boom')
 
 
 class ViewTestClass(TestCase):
@@ -8,3 +43,234 @@ class ViewTestClass(TestCase):
         response = self.client.get('/nonexist-page/')
         self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND.value)
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+class TaskWorkerTest(TransactionTestCase):
+    def test_worker_runs_queued_task(self):
+        """Задача ставится в очередь и выполняется обработчиком"""
+        cache.clear()
+        remember.delay(42)
+        self.assertEqual(Task.objects.count(), 1)
+        call_command('runworker', '--burst', '--workers=2',
+                     stdout=StringIO())
+        self.assertEqual(cache.get('remembered'), 42)
+        self.assertFalse(Task.objects.exists())
+
+
+class TaskQueueTest(TestCase):
+    @override_settings(TASKS_ALWAYS_EAGER=True)
+    def test_eager_mode_runs_inline(self):
+        """В режиме TASKS_ALWAYS_EAGER задача выполняется сразу"""
+        remember.delay('inline')
+        self.assertEqual(cache.get('remembered'), 'inline')
+        self.assertFalse(Task.objects.exists())
+
+    @override_settings(TASKS_RETRY_DELAY=0)
+    def test_failing_task_is_dead_lettered(self):
+        """Упавшая задача повторяется и после попыток помечается DEAD"""
+        explode.delay()
+        self.assertFalse(execute(claim()))
+        self.assertEqual(Task.objects.get().status, Task.QUEUED)
+        self.assertFalse(execute(claim()))
+        job = Task.objects.get()
+        self.assertEqual(job.status, Task.DEAD)
+        self.assertEqual(job.attempts, 2)
+        self.assertIn('boom', job.error)
+        self.assertIsNone(claim())
+
+    @override_settings(TASKS_LOCK_TIMEOUT=60)
+    def test_stale_task_reclaimed_once_and_counted(self):
+        """Зависшую задачу забирает один обработчик, попытки считаются"""
+        job = remember.delay('stale')
+        locked_at = timezone.now() - timedelta(minutes=5)
+        Task.objects.filter(pk=job.pk).update(status=Task.RUNNING,
+                                              locked_at=locked_at)
+        self.assertEqual(claim().attempts, 1)
+        self.assertIsNone(claim())
+        Task.objects.filter(pk=job.pk).update(locked_at=locked_at)
+        self.assertEqual(claim().attempts, 2)
+        Task.objects.filter(pk=job.pk).update(locked_at=locked_at)
+        self.assertIsNone(claim())
+        self.assertEqual(Task.objects.get().status, Task.DEAD)
+
+
+class MetricsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        registry.clear()
+        self.staff = get_user_model().objects.create_user(
+            username='staff', is_staff=True)
+
+    def test_requests_aggregated_per_view(self):
+        """Замеры запроса копятся под именем представления."""
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'))
+        stats = registry.views['posts:index']
+        self.assertEqual(stats.duration.count, 2)
+        self.assertEqual(stats.cache_misses, 1)
+        self.assertEqual(stats.cache_hits, 1)
+        self.assertGreater(stats.queries.sum, 0)
+        self.assertGreater(stats.render_time, 0)
+
+    def test_metrics_endpoint_staff_only(self):
+        """/metrics доступен только персоналу и отдаёт формат Prometheus."""
+        self.client.get(reverse('posts:index'))
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, HTTPStatus.FOUND.value)
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('metrics'))
+        self.assertContains(
+            response,
+            'yatube_request_duration_seconds_count{view="posts:index"} 1',
+        )
+        self.assertContains(response, '# TYPE yatube_cache_hits_total counter')
+
+    @override_settings(VIEW_BUDGETS={'posts:index': {'queries': 0}})
+    def test_over_budget_logged(self):
+        """Превышение бюджета представления пишется в журнал."""
+        with self.assertLogs('core.metrics', 'WARNING') as logs:
+            self.client.get(reverse('posts:index'))
+        self.assertIn('posts:index over budget', logs.output[0])
+        self.assertEqual(registry.views['posts:index'].over_budget, 1)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTest(TestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+        self.factory = RequestFactory()
+
+    def route(self, request, view=None):
+        """Возвращает базу, выбранную для чтения постов внутри запроса."""
+        seen = []
+
+        def get_response(request):
+            if view is not None:
+                middleware.process_view(request, view, (), {})
+            seen.append(self.router.db_for_read(Post))
+            if request.method == 'POST':
+                self.router.db_for_write(Post)
+            return None
+
+        middleware = ReplicaMiddleware(get_response)
+        middleware(request)
+        return seen[0]
+
+    def test_reads_go_to_replica(self):
+        """GET читает с реплики, сессии — всегда с основной базы."""
+        request = self.factory.get('/')
+        request.session = {}
+        self.assertEqual(self.route(request), 'replica')
+        self.assertEqual(self.router.db_for_read(Post), 'default')
+
+    def test_writes_stick_to_primary(self):
+        """После записи сессия какое-то время читает с основной базы."""
+        session = {}
+        post = self.factory.post('/')
+        post.session = session
+        self.assertEqual(self.route(post), 'default')
+        get = self.factory.get('/')
+        get.session = session
+        self.assertEqual(self.route(get), 'default')
+        with override_settings(REPLICA_STICKY_SECONDS=-1):
+            self.route(post)
+        self.assertEqual(self.route(get), 'replica')
+
+    def test_marked_view_reads_primary(self):
+        """Представление, пишущее на GET, читает с основной базы."""
+        request = self.factory.get('/')
+        request.session = {}
+        view = use_primary(lambda request: None)
+        self.assertEqual(self.route(request, view), 'default')
+
+    def test_reads_after_write_in_request_go_to_primary(self):
+        """Запрос, записавший в базу, дальше читает с основной базы."""
+        request = self.factory.get('/')
+        request.session = {}
+        seen = []
+
+        def get_response(request):
+            seen.append(self.router.db_for_read(Post))
+            self.router.db_for_write(Post)
+            seen.append(self.router.db_for_read(Post))
+
+        ReplicaMiddleware(get_response)(request)
+        self.assertEqual(seen, ['replica', 'default'])
+
+    def test_cached_pages_rendered_from_primary(self):
+        """Страница, которая ляжет в кэш, читается с основной базы."""
+        seen = []
+
+        @cache_page_versioned(lambda request: ['replica-test'])
+        def view(request):
+            seen.append(self.router.db_for_read(Post))
+            return HttpResponse('ok')
+
+        cache.clear()
+        for _ in range(2):
+            request = self.factory.get('/')
+            request.session = {}
+            request.user = AnonymousUser()
+            ReplicaMiddleware(view)(request)
+        self.assertEqual(seen, ['default'])
+
+
+class SQLitePragmasTest(TestCase):
+    def test_pragmas_applied_to_connection(self):
+        """Соединение SQLite получает настройки из SQLITE_PRAGMAS."""
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+
+class InliningLoaderTest(TestCase):
+    def test_includes_inlined(self):
+        """Включения с именем-строкой подставляются в текст шаблона."""
+        engine = Engine(loaders=[('core.loaders.Loader', [
+            ('django.template.loaders.locmem.Loader', {
+                'page.html': (
+                    '{% for item in items %}'
+                    '{% include "item.html" %}{% endfor %}'
+                    '{% include "block.html" %}'
+                ),
+                'item.html': '<{{ item }}>',
+                'block.html': '{% block body %}[]{% endblock %}',
+            }),
+        ])])
+        template = engine.get_template('page.html')
+        self.assertNotIn('item.html', template.source)
+        self.assertIn('block.html', template.source)
+        self.assertEqual(template.render(Context({'items': [1, 2]})),
+                         '<1><2>[]')
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(dir=settings.BASE_DIR))
+class HashedStorageTest(TransactionTestCase):
+    def tearDown(self):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+
+    def test_identical_uploads_share_one_file(self):
+        """Одинаковые картинки хранятся одним файлом до последней ссылки"""
+        author = get_user_model().objects.create_user(username='hashed')
+        first = Post.objects.create(
+            author=author, text='Первый',
+            image=ContentFile(b'same bytes', name='one.JPG'))
+        second = Post.objects.create(
+            author=author, text='Второй',
+            image=ContentFile(b'same bytes', name='two.jpg'))
+        name = first.image.name
+        self.assertEqual(second.image.name, name)
+        self.assertRegex(name, r'^posts/[0-9a-f]{2}/[0-9a-f]{2}/'
+                               r'[0-9a-f]{64}\.jpg$')
+        self.assertEqual(StoredFile.objects.get(name=name).references, 2)
+        storage = HashedStorage()
+        first.delete()
+        self.assertEqual(StoredFile.objects.get(name=name).references, 1)
+        self.assertTrue(storage.exists(name))
+        second.image = ContentFile(b'other bytes', name='three.jpg')
+        second.save()
+        self.assertFalse(StoredFile.objects.filter(name=name).exists())
+        self.assertFalse(storage.exists(name))
+        self.assertTrue(storage.exists(second.image.name))
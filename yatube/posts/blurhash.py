@@ -0,0 +1,93 @@
+'''Кодировщик BlurHash: размытая заглушка картинки в 20–30 символах.
+
+Картинка раскладывается на components_x × components_y косинусных
+гармоник в линейном RGB; первая хранит средний цвет, остальные —
+крупные пятна. Расшифровать строку можно на клиенте, а средний цвет
+сервер достаёт из неё без открытия файла (average_color).
+'''
+import math
+
+ALPHABET = ('0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+            '#$%*+,-.:;=?@[]^_{|}~')
+
+
+def encode83(value, length):
+    result = ''
+    for position in range(1, length + 1):
+        digit = value // 83 ** (length - position) % 83
+        result += ALPHABET[digit]
+    return result
+
+
+def decode83(text):
+    value = 0
+    for char in text:
+        value = value * 83 + ALPHABET.index(char)
+    return value
+
+
+def srgb_to_linear(value):
+    value /= 255
+    if value <= 0.04045:
+        return value / 12.92
+    return ((value + 0.055) / 1.055) ** 2.4
+
+
+def linear_to_srgb(value):
+    value = max(0.0, min(1.0, value))
+    if value <= 0.0031308:
+        return int(value * 12.92 * 255 + 0.5)
+    return int((1.055 * value ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+
+def sign_pow(value, exponent):
+    return math.copysign(abs(value) ** exponent, value)
+
+
+def encode(image, components_x=4, components_y=3):
+    '''Строка BlurHash для небольшой RGB-картинки Pillow'''
+    width, height = image.size
+    pixels = [tuple(srgb_to_linear(channel) for channel in pixel)
+              for pixel in image.getdata()]
+    factors = []
+    for j in range(components_y):
+        rows = [math.cos(math.pi * j * y / height) for y in range(height)]
+        for i in range(components_x):
+            columns = [math.cos(math.pi * i * x / width)
+                       for x in range(width)]
+            red = green = blue = 0.0
+            for y in range(height):
+                for x in range(width):
+                    basis = rows[y] * columns[x]
+                    pixel = pixels[y * width + x]
+                    red += basis * pixel[0]
+                    green += basis * pixel[1]
+                    blue += basis * pixel[2]
+            scale = (1 if i == j == 0 else 2) / (width * height)
+            factors.append((red * scale, green * scale, blue * scale))
+
+    dc, ac = factors[0], factors[1:]
+    result = encode83(components_x - 1 + (components_y - 1) * 9, 1)
+    if ac:
+        actual = max(abs(channel) for factor in ac for channel in factor)
+        quantised = max(0, min(82, int(actual * 166 - 0.5)))
+        maximum = (quantised + 1) / 166
+        result += encode83(quantised, 1)
+    else:
+        maximum = 1
+        result += encode83(0, 1)
+    result += encode83(
+        (linear_to_srgb(dc[0]) << 16) + (linear_to_srgb(dc[1]) << 8)
+        + linear_to_srgb(dc[2]), 4)
+    for factor in ac:
+        red, green, blue = (
+            max(0, min(18, int(sign_pow(channel / maximum, 0.5) * 9 + 9.5)))
+            for channel in factor
+        )
+        result += encode83(red * 19 * 19 + green * 19 + blue, 2)
+    return result
+
+
+def average_color(blurhash):
+    '''Средний цвет заглушки в виде #rrggbb'''
+    return '#{:06x}'.format(decode83(blurhash[2:6]))
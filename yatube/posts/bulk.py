@@ -0,0 +1,261 @@
+'''Потоковый импорт и экспорт постов в NDJSON и CSV.
+
+Импорт создаёт новые посты пачками через bulk_create (поле id файла
+не используется), поэтому сигналы не срабатывают: счётчики, ленты
+подписок, поисковый индекс, копии картинок и кэш страниц обновляются
+здесь после каждой пачки.
+'''
+import csv
+import json
+import os
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from core import storage
+from core.cache import bump
+
+from . import counters, images, thumbnails, timeline
+from .models import AuthorStats, Group, Post, User
+from .search import get_backend
+
+FIELDS = ('id', 'author', 'group', 'text', 'pub_date', 'image')
+BATCH_SIZE = 500
+
+
+@contextmanager
+def explicit_dates(*fields):
+    '''Отключает auto_now_add, чтобы даты можно было задать вручную'''
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def format_of(path, default='ndjson'):
+    extension = os.path.splitext(path)[1].lstrip('.').lower()
+    if extension in ('csv', 'ndjson'):
+        return extension
+    if extension in ('jsonl', 'json'):
+        return 'ndjson'
+    return default
+
+
+def read_rows(stream, file_format, errors):
+    '''Пары (номер строки файла, словарь) по одной.
+
+    Испорченные строки не прерывают импорт: описание ошибки с номером
+    строки добавляется в errors, и чтение продолжается.
+    '''
+    if file_format == 'csv':
+        return read_csv(stream, errors)
+    return read_ndjson(stream, errors)
+
+
+def read_csv(stream, errors):
+    reader = csv.DictReader(stream)
+    while True:
+        try:
+            row = next(reader)
+        except StopIteration:
+            return
+        except csv.Error as error:
+            errors.append(f'строка {reader.line_num}: {error}')
+            continue
+        yield reader.line_num, row
+
+
+def read_ndjson(stream, errors):
+    for number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as error:
+            errors.append(f'строка {number}: неверный JSON: {error}')
+            continue
+        if not isinstance(row, dict):
+            errors.append(f'строка {number}: ожидался объект JSON')
+            continue
+        yield number, row
+
+
+class Progress:
+    '''Печатает число строк и скорость не чаще раза в interval секунд'''
+
+    def __init__(self, write, interval=2.0):
+        self.write = write
+        self.interval = interval
+        self.rows = 0
+        self.start = self.reported = time.monotonic()
+
+    @property
+    def rate(self):
+        return self.rows / max(time.monotonic() - self.start, 1e-9)
+
+    def tick(self, rows):
+        self.rows += rows
+        now = time.monotonic()
+        if now - self.reported >= self.interval:
+            self.reported = now
+            self.write(f'{self.rows} строк, {self.rate:.0f} строк/с')
+
+
+class Importer:
+    def __init__(self, images_dir=None, batch_size=BATCH_SIZE):
+        self.images_dir = images_dir
+        self.batch_size = batch_size
+        self.authors = {}
+        self.groups = {}
+        self.errors = []
+
+    def resolve(self, rows):
+        '''Загружает авторов и группы пачки, которых ещё нет в кэше'''
+        names = {row.get('author') for row in rows} - self.authors.keys()
+        self.authors.update(User.objects.in_bulk(
+            [name for name in names if name], field_name='username'))
+        slugs = {row.get('group') for row in rows} - self.groups.keys()
+        self.groups.update(Group.objects.in_bulk(
+            [slug for slug in slugs if slug], field_name='slug'))
+
+    def image(self, name):
+        '''Имя картинки и её метаданные, если файл передан вместе с постами'''
+        if not name:
+            return '', {}
+        if self.images_dir is None:
+            return name, {}
+        field = Post._meta.get_field('image')
+        path = os.path.join(self.images_dir, name)
+        with open(path, 'rb') as source:
+            name = field.storage.save(
+                os.path.join(field.upload_to, os.path.basename(name)),
+                File(source))
+        return name, images.describe_path(path) or {}
+
+    def build(self, row):
+        author = self.authors.get(row.get('author'))
+        if author is None:
+            raise ValueError(f'нет автора {row.get("author")!r}')
+        group = None
+        if row.get('group'):
+            group = self.groups.get(row['group'])
+            if group is None:
+                raise ValueError(f'нет группы {row["group"]!r}')
+        if not row.get('text'):
+            raise ValueError('пустой текст')
+        pub_date = timezone.now()
+        if row.get('pub_date'):
+            pub_date = parse_datetime(row['pub_date'])
+            if pub_date is None:
+                raise ValueError(f'неверная дата {row["pub_date"]!r}')
+        image, fields = self.image(row.get('image'))
+        return Post(author=author, group=group, text=row['text'],
+                    pub_date=pub_date, image=image, **fields)
+
+    def insert(self, rows):
+        '''Вставляет пачку пар (номер строки, словарь)'''
+        self.resolve([row for _, row in rows])
+        posts = []
+        for number, row in rows:
+            try:
+                posts.append(self.build(row))
+            except (ValueError, OSError) as error:
+                self.errors.append(f'строка {number}: {error}')
+        if not posts:
+            return 0
+        with transaction.atomic():
+            before = Post.objects.order_by('-pk').values_list(
+                'pk', flat=True).first() or 0
+            tag = uuid.uuid4()
+            for post in posts:
+                post.import_batch = tag
+            with explicit_dates(Post._meta.get_field('pub_date')):
+                Post.objects.bulk_create(posts)
+            # Одновременно с импортом посты могут создавать и другие:
+            # диапазон pk сужает выборку, а метка оставляет только свои.
+            created = list(Post.objects.filter(
+                pk__gt=before, import_batch=tag,
+            ).select_related('author', 'group'))
+            self.after_insert(created)
+        return len(posts)
+
+    def after_insert(self, posts):
+        '''Повторяет для пачки работу сигналов сохранения поста'''
+        authors = {post.author for post in posts}
+        groups = {post.group for post in posts if post.group_id}
+        counters.recount_authors(AuthorStats.objects.filter(
+            user__in=authors))
+        counters.recount_groups(Group.objects.filter(
+            pk__in=[group.pk for group in groups]))
+        storage.acquire(*(post.image.name for post in posts if post.image))
+        backend = get_backend()
+        for post in posts:
+            timeline.fan_out(post)
+            backend.index(post)
+            if post.image:
+                thumbnails.schedule(post)
+        bump(
+            'posts',
+            *(f'author:{author.username}' for author in authors),
+            *(f'group:{group.slug}' for group in groups),
+        )
+
+    def run(self, rows, progress):
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                progress.tick(self.insert(batch))
+                batch = []
+        if batch:
+            progress.tick(self.insert(batch))
+
+
+def export_rows(queryset, chunk_size):
+    '''Посты в виде словарей, по chunk_size строк из базы за раз'''
+    rows = queryset.order_by('pk').values_list(
+        'pk', 'author__username', 'group__slug', 'text', 'pub_date',
+        'image',
+    ).iterator(chunk_size=chunk_size)
+    for pk, author, group, text, pub_date, image in rows:
+        yield {
+            'id': pk,
+            'author': author,
+            'group': group or '',
+            'text': text,
+            'pub_date': pub_date.isoformat(),
+            'image': image or '',
+        }
+
+
+def write_rows(stream, rows, file_format, images_dir=None):
+    '''Пишет строки в поток, возвращает их по одной для учёта'''
+    writer = None
+    if file_format == 'csv':
+        writer = csv.DictWriter(stream, FIELDS)
+        writer.writeheader()
+    for row in rows:
+        if images_dir and row['image']:
+            copy_image(row['image'], images_dir)
+        if writer is not None:
+            writer.writerow(row)
+        else:
+            stream.write(json.dumps(row, ensure_ascii=False) + '\n')
+        yield row
+
+
+def copy_image(name, images_dir):
+    target = os.path.join(images_dir, name)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    with default_storage.open(name) as source, open(target, 'wb') as output:
+        for chunk in source.chunks():
+            output.write(chunk)
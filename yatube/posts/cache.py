@@ -0,0 +1,128 @@
+from django.core.cache import cache
+from django.db import transaction
+
+from core.cache import bump
+from core.metrics import record_cache
+
+from .models import Comment, Group, Post, User
+
+
+def forget(*keys):
+    '''Удаляет ключи сейчас и после фиксации транзакции, как bump'''
+    def delete():
+        cache.delete_many(keys)
+    delete()
+    transaction.on_commit(delete)
+
+
+def post_key(post_id):
+    return f'post-owners:{post_id}'
+
+
+def author_key(user_id):
+    return f'username:{user_id}'
+
+
+def group_key(group_id):
+    return f'group-slug:{group_id}'
+
+
+def load_owners(post_id):
+    '''Имя автора и slug группы поста одним запросом, с записью в кэш'''
+    row = Post.objects.filter(pk=post_id).values_list(
+        'author_id', 'author__username', 'group_id', 'group__slug').first()
+    if row is None:
+        return None
+    author_id, name, group_id, slug = row
+    values = {post_key(post_id): (author_id, group_id),
+              author_key(author_id): name}
+    if group_id is not None:
+        values[group_key(group_id)] = slug
+    cache.set_many(values, None)
+    return name, slug
+
+
+def post_owners(post_id):
+    '''Имя автора и slug группы поста (None без группы).
+
+    Ключи поста, автора и группы хранятся без срока и удаляются при
+    сохранении поста, пользователя или группы.
+    '''
+    owners = cache.get(post_key(post_id))
+    if owners is not None:
+        author_id, group_id = owners
+        keys = [author_key(author_id)]
+        if group_id is not None:
+            keys.append(group_key(group_id))
+        found = cache.get_many(keys)
+        if len(found) == len(keys):
+            record_cache(True)
+            return found[keys[0]], found.get(group_key(group_id))
+    record_cache(False)
+    return load_owners(post_id)
+
+
+def index_scopes(request):
+    return ['posts']
+
+
+def group_scopes(request, slug):
+    return [f'group:{slug}']
+
+
+def profile_scopes(request, username):
+    return [f'author:{username}']
+
+
+def post_scopes(request, post_id):
+    owners = post_owners(post_id)
+    if owners is None:
+        return None
+    username, slug = owners
+    scopes = [f'post:{post_id}', f'author:{username}']
+    if slug is not None:
+        scopes.append(f'group:{slug}')
+    return scopes
+
+
+def invalidate_post(post, group_slugs=()):
+    forget(post_key(post.pk))
+    bump(
+        'posts',
+        f'post:{post.pk}',
+        f'author:{post.author.username}',
+        *(f'group:{slug}' for slug in group_slugs),
+    )
+
+
+def invalidate_author(user, previous_username):
+    '''Страницы, на которых выводятся имя и ссылки пользователя'''
+    forget(author_key(user.pk))
+    groups = Group.objects.filter(posts__author=user).values_list(
+        'slug', flat=True).distinct()
+    posts = []
+    if previous_username != user.username:
+        # Имя пользователя выводится и в его комментариях
+        posts = Comment.objects.filter(author=user).values_list(
+            'post_id', flat=True).distinct()
+    bump(
+        'posts',
+        *(f'author:{name}' for name in {user.username, previous_username}),
+        *(f'group:{slug}' for slug in groups),
+        *(f'post:{post_id}' for post_id in posts),
+    )
+
+
+def group_authors(group):
+    return set(User.objects.filter(posts__group=group).values_list(
+        'username', flat=True))
+
+
+def invalidate_group(group, slugs, authors, post_ids=()):
+    '''Страницы с названием и ссылкой группы: списки, авторы, посты'''
+    forget(group_key(group.pk), *(post_key(post_id) for post_id in post_ids))
+    bump(
+        'posts',
+        *(f'group:{slug}' for slug in slugs),
+        *(f'author:{name}' for name in authors),
+    )
@@ -0,0 +1,114 @@
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import AuthorStats, Comment, Follow, Group, Post, User
+
+BATCH_SIZE = 500
+
+AUTHOR_SOURCES = {
+    'posts_count': (Post, 'author'),
+    'comments_count': (Comment, 'author'),
+    'followers_count': (Follow, 'author'),
+    'following_count': (Follow, 'user'),
+}
+
+
+def count_of(model, field):
+    '''Подзапрос с числом строк model, ссылающихся на внешнюю запись'''
+    rows = model.objects.filter(
+        **{field: OuterRef('pk')}
+    ).order_by().values(field).annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(rows, output_field=IntegerField()), 0)
+
+
+def recount_authors(stats):
+    return stats.update(**{
+        name: count_of(model, field)
+        for name, (model, field) in AUTHOR_SOURCES.items()
+    })
+
+
+def recount_groups(groups):
+    return groups.update(posts_count=count_of(Post, 'group'))
+
+
+def create_stats(user_id):
+    AuthorStats.objects.get_or_create(user_id=user_id)
+    stats = AuthorStats.objects.filter(user_id=user_id)
+    recount_authors(stats)
+    return stats.get()
+
+
+def stats_for(user):
+    '''Счётчики автора; отсутствующая строка создаётся пересчётом'''
+    try:
+        return user.stats
+    except AuthorStats.DoesNotExist:
+        return create_stats(user.pk)
+
+
+def shifted(field, delta):
+    '''F(field) + delta, не опускающийся ниже нуля.
+
+    Разошедшийся счётчик может уже быть нулём; уменьшение тогда
+    нарушило бы ограничение PositiveIntegerField и сорвало удаление.
+    '''
+    return Greatest(F(field) + delta, 0)
+
+
+def bump_author(user_id, field, delta):
+    updated = AuthorStats.objects.filter(user_id=user_id).update(
+        **{field: shifted(field, delta)}
+    )
+    if not updated and delta > 0:
+        create_stats(user_id)
+
+
+def bump_authors(user_ids, field, delta):
+    '''bump_author для нескольких пользователей одним UPDATE'''
+    updated = AuthorStats.objects.filter(user_id__in=user_ids).update(
+        **{field: shifted(field, delta)}
+    )
+    if updated < len(user_ids) and delta > 0:
+        present = set(AuthorStats.objects.filter(
+            user_id__in=user_ids).values_list('user_id', flat=True))
+        for user_id in set(user_ids) - present:
+            create_stats(user_id)
+
+
+def bump_group(group_id, delta):
+    if group_id is not None:
+        Group.objects.filter(pk=group_id).update(
+            posts_count=shifted('posts_count', delta)
+        )
+
+
+def drifted(queryset, sources):
+    '''Строки, в которых хранимый счётчик расходится с фактическим'''
+    annotations = {
+        f'actual_{name}': count_of(model, field)
+        for name, (model, field) in sources.items()
+    }
+    in_sync = Q()
+    for name in sources:
+        in_sync &= Q(**{name: F(f'actual_{name}')})
+    return queryset.annotate(**annotations).exclude(in_sync)
+
+
+def reconcile():
+    '''Исправляет расхождения счётчиков, возвращает число исправленных'''
+    missing = User.objects.filter(
+        stats__isnull=True
+    ).values_list('pk', flat=True).iterator()
+    AuthorStats.objects.bulk_create(
+        (AuthorStats(user_id=user_id) for user_id in missing),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    authors = drifted(AuthorStats.objects.all(), AUTHOR_SOURCES)
+    groups = drifted(Group.objects.all(), {'posts_count': (Post, 'group')})
+    return (
+        recount_authors(AuthorStats.objects.filter(
+            pk__in=authors.values('pk'))),
+        recount_groups(Group.objects.filter(pk__in=groups.values('pk'))),
+    )
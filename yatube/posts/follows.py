@@ -0,0 +1,60 @@
+'''Подписки на авторов без гонок и с пакетными операциями.
+
+Вставка идёт через INSERT с пропуском конфликтов, поэтому повторная
+или одновременная подписка не падает на unique_follower_following.
+Сигналы при этом не срабатывают: счётчики сдвигаются через F() на
+число новых подписок, ленты и кэш страниц обновляются здесь же. Отписка удаляет
+строки обычным delete(), и сигналы каждой удалённой подписки
+поправляют счётчики, ленту и кэш ровно на число удалённых строк.
+'''
+from django.db import transaction
+
+from core.cache import bump
+
+from . import counters, timeline
+from .models import Follow
+
+
+def follow_many(user, authors):
+    '''Подписывает user на authors, уже существующие подписки пропускаются.
+
+    Существующие подписки читаются в той же транзакции, что и вставка:
+    в SQLite запись после чтения устаревшего снимка падает, поэтому
+    счётчики сдвигаются ровно на число вставленных строк.
+    '''
+    authors = [author for author in authors if author.pk != user.pk]
+    if not authors:
+        return
+    with transaction.atomic():
+        existing = set(Follow.objects.filter(
+            user=user, author__in=authors
+        ).values_list('author_id', flat=True))
+        authors = [author for author in authors if author.pk not in existing]
+        if not authors:
+            return
+        Follow.objects.bulk_create(
+            [Follow(user=user, author=author) for author in authors],
+            ignore_conflicts=True,
+        )
+        counters.bump_author(user.pk, 'following_count', len(authors))
+        counters.bump_authors([author.pk for author in authors],
+                              'followers_count', 1)
+    timeline.backfill(user.pk, *(author.pk for author in authors))
+    bump(*(f'author:{author.username}' for author in authors))
+
+
+def unfollow_many(user, authors):
+    '''Отписывает user от authors, возвращает число удалённых подписок'''
+    if not authors:
+        return 0
+    deleted, _ = Follow.objects.filter(
+        user=user, author__in=authors).select_related('author').delete()
+    return deleted
+
+
+def follow(user, author):
+    follow_many(user, [author])
+
+
+def unfollow(user, author):
+    unfollow_many(user, [author])
@@ -1,5 +1,11 @@
+from concurrent.futures.process import BrokenProcessPool
+
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
 from django.forms import ModelForm
+from PIL import Image
 
+from . import images, thumbnails
 from .models import Comment, Post
 
 
@@ -18,6 +24,31 @@ class PostForm(ModelForm):
             'image': 'Добавьте картинку'
         }
 
+    def clean_image(self):
+        '''Новую картинку уменьшает и перекодирует без метаданных'''
+        image = self.cleaned_data.get('image')
+        if isinstance(image, UploadedFile):
+            try:
+                image, self.image_metadata = images.process_upload(image)
+            except (OSError, Image.DecompressionBombError,
+                    BrokenProcessPool):
+                raise ValidationError(
+                    'Не удалось обработать картинку: файл повреждён '
+                    'или слишком велик')
+        return image
+
+    def save(self, commit=True):
+        image_changed = 'image' in self.changed_data
+        if image_changed:
+            self.instance.thumbnails_ready = False
+            fields = getattr(self, 'image_metadata', images.EMPTY_METADATA)
+            for field, value in fields.items():
+                setattr(self.instance, field, value)
+        post = super().save(commit)
+        if commit and image_changed and post.image:
+            thumbnails.schedule(post)
+        return post
+
 
 class CommentForm(ModelForm):
     class Meta:
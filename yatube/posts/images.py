@@ -0,0 +1,196 @@
+'''Обработка загруженных картинок перед сохранением.
+
+Картинка декодируется один раз, поворачивается по EXIF, уменьшается
+до POST_IMAGE_MAX_SIZE и перекодируется без метаданных в первый
+доступный формат из POST_IMAGE_FORMATS. Работа Pillow идёт в пуле
+процессов, чтобы не занимать процессор потоков, отвечающих на запросы.
+'''
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, features
+
+from . import blurhash
+
+EXTENSIONS = {'WEBP': 'webp', 'JPEG': 'jpg'}
+QUALITY = 85
+PLACEHOLDER_SIZE = (32, 32)
+# Значения EXIF Orientation, при которых картинка повёрнута на 90°
+ROTATED = (5, 6, 7, 8)
+EMPTY_METADATA = {
+    'image_width': None,
+    'image_height': None,
+    'image_size': None,
+    'image_placeholder': '',
+}
+
+lock = threading.Lock()
+executor = None
+
+
+def output_format(formats):
+    '''Первый формат, который умеет кодировать установленный Pillow'''
+    for name in formats:
+        if name == 'JPEG' or features.check(name.lower()):
+            return name
+    raise ValueError(f'Ни один из форматов {formats} не поддерживается')
+
+
+def flatten(image):
+    '''RGB без прозрачности: прозрачные области заливаются белым'''
+    if image.mode in ('RGBA', 'LA') or 'transparency' in image.info:
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def placeholder(image):
+    small = flatten(image)
+    small.thumbnail(PLACEHOLDER_SIZE)
+    return blurhash.encode(small)
+
+
+def metadata(width, height, size, image):
+    return {
+        'image_width': width,
+        'image_height': height,
+        'image_size': size,
+        'image_placeholder': placeholder(image),
+    }
+
+
+def describe_path(path):
+    '''Размеры, объём и заглушка файла; None, если файл не читается.
+
+    Для уже лежащих в хранилище картинок, которые могли не проходить
+    обработку: размеры даются с учётом поворота из EXIF.
+    '''
+    try:
+        size = os.path.getsize(path)
+        with Image.open(path) as image:
+            width, height = image.size
+            if image.getexif().get(0x0112) in ROTATED:
+                width, height = height, width
+            image.draft('RGB', PLACEHOLDER_SIZE)
+            return metadata(width, height, size,
+                            ImageOps.exif_transpose(image))
+    except (OSError, Image.DecompressionBombError):
+        return None
+
+
+def process(data, max_size, formats):
+    '''Байты картинки -> (байты, расширение, метаданные) в уменьшенном виде.
+
+    Выполняется в дочернем процессе, поэтому принимает и возвращает
+    только простые значения и не обращается к настройкам Django.
+    '''
+    image = Image.open(BytesIO(data))
+    image.draft('RGB', max_size)
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail(max_size, Image.LANCZOS)
+    name = output_format(formats)
+    if name == 'WEBP' and image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+    else:
+        image = flatten(image)
+    buffer = BytesIO()
+    image.save(buffer, name, quality=QUALITY, optimize=True)
+    data = buffer.getvalue()
+    return data, EXTENSIONS[name], metadata(*image.size, len(data), image)
+
+
+def get_executor():
+    global executor
+    with lock:
+        if executor is None:
+            executor = ProcessPoolExecutor(
+                max_workers=settings.POST_IMAGE_WORKERS)
+        return executor
+
+
+def discard_executor(pool):
+    '''Забывает сломанный пул, чтобы следующий вызов создал новый'''
+    global executor
+    with lock:
+        if executor is pool:
+            executor = None
+    pool.shutdown(wait=False)
+
+
+def run_in_pool(*args):
+    '''Выполняет process в пуле; пул с погибшим процессом пересоздаётся.
+
+    Процесс пула может убить, например, нехватка памяти на огромной
+    картинке. Тогда пул перестаёт принимать задачи, и без пересоздания
+    все следующие загрузки падали бы до перезапуска сервера.
+    '''
+    for attempt in range(2):
+        pool = get_executor()
+        try:
+            return pool.submit(process, *args).result()
+        except BrokenProcessPool:
+            discard_executor(pool)
+            if attempt:
+                raise
+
+
+def process_upload(upload):
+    '''Обрабатывает загруженный файл: ContentFile для поля и метаданные'''
+    upload.seek(0)
+    args = (upload.read(), tuple(settings.POST_IMAGE_MAX_SIZE),
+            tuple(settings.POST_IMAGE_FORMATS))
+    if settings.POST_IMAGE_WORKERS:
+        data, extension, fields = run_in_pool(*args)
+    else:
+        data, extension, fields = process(*args)
+    stem, _ = os.path.splitext(os.path.basename(upload.name))
+    return ContentFile(data, name=f'{stem}.{extension}'), fields
+
+
+def storage_path(storage, name):
+    try:
+        return storage.path(name)
+    except SuspiciousFileOperation:
+        return None
+
+
+def backfill(posts, batch_size, workers, progress):
+    '''Заполняет метаданные картинок постов пачками по batch_size.
+
+    Файлы читаются в workers процессах; одинаковые имена из пачки
+    описываются один раз и обновляются одним UPDATE. Возвращает имена,
+    которые не удалось прочитать.
+    '''
+    from .models import Post
+
+    storage = Post._meta.get_field('image').storage
+    posts = posts.exclude(image='').order_by('pk')
+    failed = []
+    last = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while True:
+            batch = list(posts.filter(pk__gt=last).values_list(
+                'pk', 'image')[:batch_size])
+            if not batch:
+                break
+            last = batch[-1][0]
+            names = sorted({name for _, name in batch})
+            paths = [storage_path(storage, name) or '' for name in names]
+            for name, fields in zip(names, pool.map(
+                    describe_path, paths, chunksize=16)):
+                if fields is None:
+                    failed.append(name)
+                    continue
+                Post.objects.filter(
+                    pk__in=[pk for pk, image in batch if image == name]
+                ).update(**fields)
+            progress.tick(len(batch))
+    return failed
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from posts import bulk, images
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = ('Заполняет размеры, объём и заглушку картинок постов, '
+            'читая файлы в нескольких процессах')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=bulk.BATCH_SIZE)
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Пересчитать и уже заполненные посты',
+        )
+
+    def handle(self, *args, **options):
+        posts = Post.objects.all()
+        if not options['all']:
+            posts = posts.filter(image_width__isnull=True)
+        progress = bulk.Progress(self.stdout.write)
+        failed = images.backfill(posts, options['batch_size'],
+                                 options['workers'], progress)
+        for name in failed:
+            self.stderr.write(f'Не удалось прочитать {name}')
+        self.stdout.write(
+            f'Обработано {progress.rows} постов, не прочитано файлов '
+            f'{len(failed)}, {progress.rate:.0f} постов/с'
+        )
@@ -0,0 +1,73 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from posts import timeline
+from posts.models import Comment, Post, User
+from posts.utils import NUM_OF_POSTS, CursorPaginator
+
+SORT = 'USE TEMP B-TREE FOR '
+
+
+def full_scan(plan):
+    '''Есть ли в плане чтение таблицы без индекса'''
+    return any('SCAN ' in line and ' USING ' not in line
+               for line in plan.splitlines())
+
+
+def sorts(plan):
+    '''Сортирует ли план строки во временном B-дереве для ORDER BY.
+
+    Такой список читает все подходящие строки, прежде чем отдать первую
+    страницу, даже если каждая из них найдена по индексу.
+    '''
+    return any(SORT in line and 'ORDER BY' in line
+               for line in plan.splitlines())
+
+
+class Command(BaseCommand):
+    help = ('Выполняет EXPLAIN для запросов списков и падает, если '
+            'какой-либо из них сортирует строки или читает таблицу целиком')
+
+    def listings(self):
+        '''Запросы страниц в том виде, в каком их строят представления'''
+        user = User(pk=1)
+        return {
+            'posts:index': Post.objects.for_listing(),
+            'posts:group_posts': Post.objects.filter(group_id=1).for_listing(),
+            'posts:profile': Post.objects.filter(author_id=1).for_listing(),
+            'posts:follow_index': timeline.feed(user).for_listing(),
+            'posts:post_detail': Comment.objects.filter(
+                post_id=1).for_listing(),
+        }
+
+    def pages(self, queryset):
+        if queryset.model is Comment:
+            paginator = CursorPaginator(queryset, NUM_OF_POSTS,
+                                        ordering=('created', 'id'))
+        else:
+            paginator = CursorPaginator(queryset, NUM_OF_POSTS)
+        cursor = (timezone.now(), 1)
+        window = NUM_OF_POSTS + 1
+        return {
+            'первая страница': paginator.object_list[:window],
+            'следующая страница': paginator.object_list.filter(
+                paginator.seek_filter(cursor, forward=True))[:window],
+        }
+
+    def handle(self, *args, **options):
+        failed = []
+        for view_name, queryset in self.listings().items():
+            for page, query in self.pages(queryset).items():
+                plan = query.explain()
+                bad = sorts(plan) or full_scan(plan)
+                status = 'FAIL' if bad else 'OK'
+                self.stdout.write(f'{status} {view_name} ({page})')
+                if options['verbosity'] > 1 or bad:
+                    self.stdout.write(plan)
+                if bad:
+                    failed.append(view_name)
+        if failed:
+            raise CommandError(
+                'Сортировка или полный просмотр таблицы: '
+                + ', '.join(sorted(set(failed)))
+            )
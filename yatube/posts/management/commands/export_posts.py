@@ -0,0 +1,47 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from posts import bulk
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Выгружает посты в NDJSON или CSV, читая базу порциями'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл или - для stdout')
+        parser.add_argument('--format', choices=('ndjson', 'csv'))
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument('--author', help='Только посты автора')
+        parser.add_argument('--group', help='Только посты группы (slug)')
+        parser.add_argument(
+            '--images-dir', help='Скопировать картинки постов в каталог')
+
+    def handle(self, *args, **options):
+        file_format = options['format'] or bulk.format_of(options['path'])
+        posts = Post.objects.all()
+        if options['author']:
+            posts = posts.filter(author__username=options['author'])
+        if options['group']:
+            posts = posts.filter(group__slug=options['group'])
+        to_stdout = options['path'] == '-'
+        stream = (sys.stdout if to_stdout
+                  else open(options['path'], 'w', newline='',
+                            encoding='utf-8'))
+        progress = bulk.Progress(
+            self.stderr.write if to_stdout else self.stdout.write)
+        try:
+            rows = bulk.write_rows(
+                stream,
+                bulk.export_rows(posts, options['chunk_size']),
+                file_format,
+                options['images_dir'],
+            )
+            for _ in rows:
+                progress.tick(1)
+        finally:
+            if not to_stdout:
+                stream.close()
+        progress.write(
+            f'Выгружено {progress.rows} постов, {progress.rate:.0f} строк/с')
@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand
+
+from posts import bulk, media
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = ('Удаляет из каталога картинок постов файлы и миниатюры, '
+            'на которые не ссылается ни один пост, и оставшиеся '
+            'миниатюры sorl-thumbnail')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать файлы, которые были бы удалены',
+        )
+        parser.add_argument('--batch-size', type=int, default=bulk.BATCH_SIZE)
+        parser.add_argument('--workers', type=int, default=8)
+        parser.add_argument(
+            '--min-age', type=int, default=60 * 60,
+            help='Не трогать файлы моложе стольких секунд',
+        )
+
+    def collect(self, batches, storage, options):
+        files = total = 0
+        for garbage in batches:
+            names = [name for name, _ in garbage]
+            if options['dry_run']:
+                for name in names:
+                    self.stdout.write(name)
+            else:
+                media.delete(storage, names, options['workers'])
+            files += len(garbage)
+            total += sum(size for _, size in garbage)
+        return files, total
+
+    def handle(self, *args, **options):
+        field = Post._meta.get_field('image')
+        directory = field.upload_to.rstrip('/')
+        files, total = self.collect(
+            media.unreferenced(field.storage, directory,
+                               options['batch_size'], options['min_age']),
+            field.storage, options,
+        )
+        sorl_files, sorl_total = self.collect(
+            media.sorl_leftovers(options['batch_size'], options['min_age']),
+            media.sorl_default.storage, options,
+        )
+        if not options['dry_run']:
+            media.sorl_default.kvstore.clear()
+        action = 'Будет удалено' if options['dry_run'] else 'Удалено'
+        self.stdout.write(
+            f'{action} файлов: {files + sorl_files} '
+            f'(из них миниатюр sorl-thumbnail: {sorl_files}), '
+            f'{(total + sorl_total) / 1024 / 1024:.1f} МБ')
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from posts import bulk, thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = ('Ставит в очередь нарезку миниатюр для постов, созданных до '
+            'появления заранее подготовленных копий')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=bulk.BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        scheduled = thumbnails.backfill(Post.objects.all(),
+                                        options['batch_size'])
+        self.stdout.write(f'Поставлено в очередь задач: {scheduled}')
@@ -0,0 +1,47 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import bulk
+
+
+class Command(BaseCommand):
+    help = ('Импортирует посты из NDJSON или CSV с полями author, group, '
+            'text, pub_date, image, читая файл потоком')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл или - для stdin')
+        parser.add_argument('--format', choices=('ndjson', 'csv'))
+        parser.add_argument('--batch-size', type=int, default=bulk.BATCH_SIZE)
+        parser.add_argument(
+            '--images-dir',
+            help='Каталог с файлами картинок; без него поле image '
+                 'считается именем файла в хранилище',
+        )
+
+    def handle(self, *args, **options):
+        file_format = options['format'] or bulk.format_of(options['path'])
+        importer = bulk.Importer(options['images_dir'],
+                                 options['batch_size'])
+        progress = bulk.Progress(self.stdout.write)
+        if options['path'] == '-':
+            stream = sys.stdin
+        else:
+            try:
+                stream = open(options['path'], newline='', encoding='utf-8')
+            except OSError as error:
+                raise CommandError(error)
+        try:
+            importer.run(bulk.read_rows(stream, file_format, importer.errors),
+                         progress)
+        except ValueError as error:
+            raise CommandError(f'Ошибка формата: {error}')
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+        for error in importer.errors:
+            self.stderr.write(error)
+        self.stdout.write(
+            f'Импортировано {progress.rows} постов, пропущено '
+            f'{len(importer.errors)}, {progress.rate:.0f} строк/с'
+        )
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from posts import bulk
+from posts.models import Post
+from posts.search import get_backend
+
+
+class Command(BaseCommand):
+    help = ('Заново заполняет поисковый индекс постов, например после '
+            'миграции или изменения разбора текста на слова')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=bulk.BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        count = get_backend().rebuild(Post.objects.all(),
+                                      options['batch_size'])
+        self.stdout.write(f'Проиндексировано постов: {count}')
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from posts import counters
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики авторов и групп, разошедшиеся с данными'
+
+    def handle(self, *args, **options):
+        authors, groups = counters.reconcile()
+        self.stdout.write(
+            f'Исправлено авторов: {authors}, групп: {groups}'
+        )
@@ -0,0 +1,121 @@
+'''Поиск и удаление файлов медиа, на которые не ссылается ни один пост'''
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.conf import settings
+from django.db.models import Q
+from sorl.thumbnail import default as sorl_default
+from sorl.thumbnail.conf import settings as sorl_settings
+
+from core.models import StoredFile
+
+from .models import Post
+
+# Выражение в SQLite не может быть глубже 1000 уровней, а каждый
+# диапазон имён добавляет в цепочку OR свой уровень.
+RANGES_PER_QUERY = 100
+VARIANT = re.compile(r'^(?P<root>.+)_(?P<width>\d+)x(?P<height>\d+)\.jpg$')
+
+
+def walk(root, directory):
+    '''Имена файлов относительно root; каталоги читаются по одному'''
+    try:
+        entries = os.scandir(os.path.join(root, directory))
+    except FileNotFoundError:
+        return
+    with entries:
+        for entry in entries:
+            name = os.path.join(directory, entry.name)
+            if entry.is_dir(follow_symlinks=False):
+                yield from walk(root, name)
+            elif entry.is_file(follow_symlinks=False):
+                yield name, entry.stat(follow_symlinks=False)
+
+
+def batches(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def original_root(name):
+    '''Для копии из posts.thumbnails — имя оригинала без расширения'''
+    match = VARIANT.match(name)
+    if match is None:
+        return None
+    size = (int(match.group('width')), int(match.group('height')))
+    if size not in settings.POST_THUMBNAIL_SIZES.values():
+        return None
+    return match.group('root')
+
+
+def referenced(names):
+    '''Имена из names, которые используют посты или их копии'''
+    roots = {name: original_root(name) for name in names}
+    used = set(Post.objects.filter(image__in=names).values_list(
+        'image', flat=True))
+    variant_roots = sorted({root for root in roots.values() if root})
+    used_roots = set()
+    for chunk in batches(variant_roots, RANGES_PER_QUERY):
+        condition = Q()
+        for root in chunk:
+            # Оригинал root.<расширение>: диапазон по индексу вместо LIKE
+            condition |= Q(image__gte=root + '.', image__lt=root + '/')
+        for image in Post.objects.filter(condition).values_list(
+                'image', flat=True):
+            used_roots.add(os.path.splitext(image)[0])
+    return {
+        name for name in names
+        if name in used or roots[name] in used_roots
+    }
+
+
+def stale(storage, directory, batch_size, min_age):
+    '''Пачки (имя, stat) файлов каталога старше min_age секунд.
+
+    Обход идёт по одному каталогу, а в памяти не бывает больше одной
+    пачки имён. Свежие файлы пропускаются: пост с только что
+    сохранённой картинкой может быть ещё не зафиксирован.
+    '''
+    deadline = time.time() - min_age
+    files = (
+        (name.replace(os.sep, '/'), stat)
+        for name, stat in walk(storage.location, directory)
+        if stat.st_mtime < deadline
+    )
+    return batches(files, batch_size)
+
+
+def unreferenced(storage, directory, batch_size, min_age):
+    '''Пачки (имя, размер) старых файлов, на которые не ссылаются посты'''
+    for batch in stale(storage, directory, batch_size, min_age):
+        used = referenced([name for name, _ in batch])
+        garbage = [(name, stat.st_size) for name, stat in batch
+                   if name not in used]
+        if garbage:
+            yield garbage
+
+
+def sorl_leftovers(batch_size, min_age):
+    '''Пачки (имя, размер) старых миниатюр sorl-thumbnail.
+
+    Шаблоны берут копии из posts.thumbnails, поэтому всё, что sorl
+    сохранил под THUMBNAIL_PREFIX, больше ничем не используется.
+    '''
+    directory = sorl_settings.THUMBNAIL_PREFIX.strip('/')
+    for batch in stale(sorl_default.storage, directory, batch_size,
+                       min_age):
+        yield [(name, stat.st_size) for name, stat in batch]
+
+
+def delete(storage, names, workers):
+    '''Удаляет файлы в workers потоках и их счётчики ссылок'''
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(storage.delete, names))
+    StoredFile.objects.filter(name__in=names).delete()
@@ -0,0 +1,32 @@
+from django.db import migrations
+
+TABLE = 'posts_search'
+
+
+def create_index(apps, schema_editor):
+    '''Создаёт пустой индекс; его заполняет команда rebuild_search_index'''
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING '
+            "fts5(body, tokenize='unicode61 remove_diacritics 0')"
+        )
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0011_post_thumbnails_ready'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
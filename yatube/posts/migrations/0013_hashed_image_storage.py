@@ -0,0 +1,38 @@
+# Generated by Django 2.2.16 on 2026-10-17 02:13
+
+import core.storage
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_references(apps, schema_editor):
+    '''Существующие картинки остаются на месте, их ссылки подсчитываются'''
+    Post = apps.get_model('posts', 'Post')
+    StoredFile = apps.get_model('core', 'StoredFile')
+    counts = (
+        Post.objects.exclude(image='').values('image')
+        .annotate(references=Count('pk')).order_by()
+    )
+    StoredFile.objects.bulk_create(
+        (StoredFile(name=row['image'], references=row['references'])
+         for row in counts.iterator()),
+        batch_size=500,
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_stored_file'),
+        ('posts', '0012_search_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, storage=core.storage.HashedStorage(), upload_to='posts/', verbose_name='Картинка'),
+        ),
+        migrations.RunPython(count_references, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 2.2.16 on 2026-10-17 02:24
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_celebrity_posts(apps, schema_editor):
+    '''Посты нынешних знаменитостей не были разложены по лентам'''
+    Post = apps.get_model('posts', 'Post')
+    Post.objects.filter(
+        author__stats__followers_count__gte=(
+            settings.TIMELINE_CELEBRITY_FOLLOWERS),
+    ).update(fanned_out=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_post_image_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='fanned_out',
+            field=models.BooleanField(default=True, editable=False),
+        ),
+        migrations.RunPython(mark_celebrity_posts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-17 02:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_post_fanned_out'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='import_batch',
+            field=models.UUIDField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -2,6 +2,11 @@ from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.db import models
 
+from core.storage import HashedStorage
+
+from .blurhash import average_color
+from .thumbnails import variant_urls
+
 User = get_user_model()
 
 
@@ -9,12 +14,26 @@ class Group(models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(unique=True)
     description = models.TextField()
+    posts_count = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self):
 
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    def for_listing(self):
+        return self.select_related('author', 'group')
+
+    def for_detail(self):
+        return self.select_related('author__stats', 'group')
+
+
+class CommentQuerySet(models.QuerySet):
+    def for_listing(self):
+        return self.select_related('author')
+
+
 class Post(models.Model):
     text = models.TextField(help_text='Введите текст')
     pub_date = models.DateTimeField(auto_now_add=True)
@@ -33,16 +52,77 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
-        blank=True
+        storage=HashedStorage(),
+        blank=True,
+        db_index=True
     )
+    thumbnails_ready = models.BooleanField(default=False, editable=False)
+    # False — пост не разложен по лентам и читается при запросе ленты
+    fanned_out = models.BooleanField(default=True, editable=False)
+    # Метка пачки импорта: по ней находятся только что вставленные посты
+    import_batch = models.UUIDField(blank=True, null=True, editable=False)
+    image_width = models.PositiveIntegerField(
+        blank=True, null=True, editable=False)
+    image_height = models.PositiveIntegerField(
+        blank=True, null=True, editable=False)
+    image_size = models.PositiveIntegerField(
+        'Размер картинки, байт', blank=True, null=True, editable=False)
+    image_placeholder = models.CharField(
+        'Заглушка BlurHash', max_length=32, blank=True, editable=False)
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         verbose_name_plural = 'Посты'
-        ordering = ['-pub_date']
+        ordering = ['-pub_date', '-id']
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'],
+                         name='post_pub_date_idx'),
+            models.Index(fields=['group', '-pub_date', '-id'],
+                         name='post_group_pub_date_idx'),
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         name='post_author_pub_date_idx'),
+            models.Index(fields=['author', 'fanned_out', '-pub_date', '-id'],
+                         name='post_author_unfanned_idx'),
+        ]
 
     def __str__(self):
         return self.text[:settings.POST_STR_SYMBOLS]
 
+    @property
+    def thumbnails(self):
+        '''Адреса готовых копий; пока их нет — адрес оригинала'''
+        if not self.image:
+            return {}
+        if self.thumbnails_ready:
+            return variant_urls(self.image.name)
+        return dict.fromkeys(settings.POST_THUMBNAIL_SIZES, self.image.url)
+
+    @property
+    def image_srcset(self):
+        '''srcset из готовых копий по возрастанию ширины'''
+        if not self.image or not self.thumbnails_ready:
+            return ''
+        urls = variant_urls(self.image.name)
+        sizes = sorted(settings.POST_THUMBNAIL_SIZES.items(),
+                       key=lambda item: item[1][0])
+        return ', '.join(f'{urls[label]} {size[0]}w' for label, size in sizes)
+
+    @property
+    def image_display_size(self):
+        '''Размеры картинки карточки без чтения файла; None, если неизвестны'''
+        if self.thumbnails_ready:
+            return settings.POST_THUMBNAIL_SIZES['card']
+        if self.image_width and self.image_height:
+            return self.image_width, self.image_height
+        return None
+
+    @property
+    def image_color(self):
+        if not self.image_placeholder:
+            return ''
+        return average_color(self.image_placeholder)
+
 
 class Comment(models.Model):
     post = models.ForeignKey(
@@ -58,6 +138,15 @@ class Comment(models.Model):
     text = models.TextField(help_text='Введите текст комментария')
     created = models.DateTimeField(auto_now_add=True)
 
+    objects = CommentQuerySet.as_manager()
+
+    class Meta:
+        ordering = ['created', 'id']
+        indexes = [
+            models.Index(fields=['post', 'created', 'id'],
+                         name='comment_post_created_idx'),
+        ]
+
 
 class Follow(models.Model):
     user = models.ForeignKey(
@@ -76,3 +165,46 @@ class Follow(models.Model):
             models.UniqueConstraint(fields=['user', 'author'],
                                     name='unique_follower_following')
         ]
+
+
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries'
+    )
+    # Копии полей поста: лента читается по индексу без обращения к постам
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'post'],
+                                    name='unique_timeline_user_post')
+        ]
+        indexes = [
+            models.Index(fields=['user', '-pub_date', '-post'],
+                         name='timeline_user_pub_date_idx'),
+        ]
+
+
+class AuthorStats(models.Model):
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats'
+    )
+    posts_count = models.PositiveIntegerField(default=0)
+    comments_count = models.PositiveIntegerField(default=0)
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
@@ -0,0 +1,154 @@
+import re
+from itertools import islice
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+from .models import Post
+from .stemmer import stem
+
+WORD = re.compile(r'\w+')
+CYRILLIC = re.compile(r'[а-яё]')
+
+
+def tokens(text):
+    '''Слова текста в нижнем регистре, русские — приведённые к основе'''
+    return [
+        stem(word) if CYRILLIC.search(word) else word
+        for word in WORD.findall(text.lower())
+    ]
+
+
+class SearchResults:
+    '''Ленивый список найденных постов в порядке релевантности.
+
+    Поддерживает count() и срезы, поэтому подходит для Paginator:
+    страница выбирает из индекса только свои id.
+    '''
+
+    def __init__(self, backend, query):
+        self.backend = backend
+        self.query = query
+
+    def count(self):
+        return self.backend.count(self.query)
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, window):
+        ids = self.backend.ids(self.query, window.start or 0,
+                               window.stop - (window.start or 0))
+        posts = Post.objects.for_listing().in_bulk(ids)
+        return [posts[pk] for pk in ids if pk in posts]
+
+
+class DatabaseBackend:
+    '''Запасной поиск подстрокой для баз без полнотекстового индекса'''
+
+    def matching(self, queryset, query):
+        condition = Q()
+        for word in WORD.findall(query):
+            condition &= Q(text__icontains=word)
+        return queryset.filter(condition)
+
+    def count(self, query):
+        return self.matching(Post.objects.all(), query).count()
+
+    def ids(self, query, offset, limit):
+        matching = self.matching(Post.objects.all(), query)
+        return list(matching.values_list('pk', flat=True)[
+            offset:offset + limit])
+
+    def index(self, post):
+        pass
+
+    def remove(self, post_id):
+        pass
+
+    def rebuild(self, posts, batch_size):
+        return 0
+
+
+class SQLiteFTSBackend(DatabaseBackend):
+    '''Инвертированный индекс основ слов в таблице SQLite FTS5'''
+
+    table = 'posts_search'
+
+    def match(self, query):
+        '''Выражение MATCH: все основы запроса, каждая как префикс'''
+        terms = tokens(query)
+        return ' '.join('"{}"*'.format(term.replace('"', '""'))
+                        for term in terms)
+
+    def matching(self, queryset, query):
+        expression = self.match(query)
+        if not expression:
+            return queryset.none()
+        return queryset.filter(pk__in=RawSQL(
+            f'SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s',
+            [expression],
+        ))
+
+    def execute(self, sql, params):
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+    def count(self, query):
+        expression = self.match(query)
+        if not expression:
+            return 0
+        return self.execute(
+            f'SELECT count(*) FROM {self.table} WHERE {self.table} MATCH %s',
+            [expression],
+        )[0][0]
+
+    def ids(self, query, offset, limit):
+        expression = self.match(query)
+        if not expression:
+            return []
+        rows = self.execute(
+            f'SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s '
+            'ORDER BY rank LIMIT %s OFFSET %s',
+            [expression, limit, offset],
+        )
+        return [row[0] for row in rows]
+
+    def index(self, post):
+        self.remove(post.pk)
+        self.execute(
+            f'INSERT INTO {self.table} (rowid, body) VALUES (%s, %s)',
+            [post.pk, ' '.join(tokens(post.text))],
+        )
+
+    def remove(self, post_id):
+        self.execute(f'DELETE FROM {self.table} WHERE rowid = %s', [post_id])
+
+    def rebuild(self, posts, batch_size):
+        '''Заново индексирует posts пачками, возвращает их число'''
+        self.execute(f'DELETE FROM {self.table}', [])
+        rows = posts.order_by().values_list('pk', 'text').iterator(
+            chunk_size=batch_size)
+        count = 0
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                return count
+            with connection.cursor() as cursor:
+                cursor.executemany(
+                    f'INSERT INTO {self.table} (rowid, body) VALUES (%s, %s)',
+                    [(pk, ' '.join(tokens(text))) for pk, text in batch],
+                )
+            count += len(batch)
+
+
+def get_backend():
+    return import_string(settings.SEARCH_BACKEND)()
+
+
+def search_posts(query):
+    return SearchResults(get_backend(), query)
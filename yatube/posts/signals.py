@@ -0,0 +1,193 @@
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+
+from core import storage
+from core.cache import bump
+
+from . import counters, timeline
+from .cache import (group_authors, invalidate_author, invalidate_group,
+                    invalidate_post)
+from .models import Comment, Follow, Group, Post, User
+from .search import get_backend
+
+# Поля пользователя, которые выводятся на кэшируемых страницах
+USER_NAME_FIELDS = ('username', 'first_name', 'last_name')
+
+
+@receiver(post_save, sender=User)
+def create_author_stats(sender, instance, created, **kwargs):
+    if created:
+        counters.create_stats(instance.pk)
+
+
+@receiver(pre_save, sender=Post)
+def move_group_counter(sender, instance, **kwargs):
+    if instance.pk is None:
+        return
+    previous = Post.objects.filter(
+        pk=instance.pk
+    ).values_list('group_id', 'group__slug').first()
+    if previous is not None and previous[0] != instance.group_id:
+        counters.bump_group(previous[0], -1)
+        counters.bump_group(instance.group_id, 1)
+        if previous[1] is not None:
+            bump(f'group:{previous[1]}')
+
+
+@receiver(post_save, sender=Post)
+def count_post(sender, instance, created, **kwargs):
+    if created:
+        counters.bump_author(instance.author_id, 'posts_count', 1)
+        counters.bump_group(instance.group_id, 1)
+
+
+@receiver(post_delete, sender=Post)
+def uncount_post(sender, instance, **kwargs):
+    counters.bump_author(instance.author_id, 'posts_count', -1)
+    counters.bump_group(instance.group_id, -1)
+
+
+@receiver(post_save, sender=Comment)
+def count_comment(sender, instance, created, **kwargs):
+    if created:
+        counters.bump_author(instance.author_id, 'comments_count', 1)
+
+
+@receiver(post_delete, sender=Comment)
+def uncount_comment(sender, instance, **kwargs):
+    counters.bump_author(instance.author_id, 'comments_count', -1)
+
+
+@receiver(post_save, sender=Follow)
+def count_follow(sender, instance, created, **kwargs):
+    if created:
+        counters.bump_author(instance.author_id, 'followers_count', 1)
+        counters.bump_author(instance.user_id, 'following_count', 1)
+
+
+@receiver(post_delete, sender=Follow)
+def uncount_follow(sender, instance, **kwargs):
+    counters.bump_author(instance.author_id, 'followers_count', -1)
+    counters.bump_author(instance.user_id, 'following_count', -1)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, **kwargs):
+    if created:
+        timeline.fan_out(instance)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, **kwargs):
+    if created:
+        timeline.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_timeline(sender, instance, **kwargs):
+    timeline.prune(instance.user_id, instance.author_id)
+
+
+def group_slugs(post):
+    return [post.group.slug] if post.group_id else []
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_pages(sender, instance, **kwargs):
+    invalidate_post(instance, group_slugs(instance))
+
+
+@receiver(pre_save, sender=Group)
+def remember_group_slug(sender, instance, **kwargs):
+    instance.previous_slug = None
+    if instance.pk is not None:
+        instance.previous_slug = Group.objects.filter(
+            pk=instance.pk).values_list('slug', flat=True).first()
+
+
+@receiver(post_save, sender=Group)
+def invalidate_group_pages(sender, instance, **kwargs):
+    slugs = {instance.slug, getattr(instance, 'previous_slug', None)}
+    invalidate_group(instance, slugs - {None}, group_authors(instance))
+
+
+@receiver(pre_delete, sender=Group)
+def remember_group_posts(sender, instance, **kwargs):
+    instance.deleted_posts = list(
+        instance.posts.values_list('pk', 'author__username'))
+
+
+@receiver(post_delete, sender=Group)
+def invalidate_deleted_group_pages(sender, instance, **kwargs):
+    posts = getattr(instance, 'deleted_posts', [])
+    invalidate_group(instance, [instance.slug],
+                     {name for _, name in posts},
+                     [post_id for post_id, _ in posts])
+
+
+@receiver(pre_save, sender=User)
+def remember_user_names(sender, instance, update_fields=None, **kwargs):
+    instance.previous_names = None
+    if instance.pk is None or (
+            update_fields is not None
+            and set(USER_NAME_FIELDS).isdisjoint(update_fields)):
+        return
+    instance.previous_names = User.objects.filter(
+        pk=instance.pk).values_list(*USER_NAME_FIELDS).first()
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_pages(sender, instance, **kwargs):
+    previous = getattr(instance, 'previous_names', None)
+    current = tuple(getattr(instance, name) for name in USER_NAME_FIELDS)
+    if previous is not None and previous != current:
+        invalidate_author(instance, previous[0])
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment_pages(sender, instance, **kwargs):
+    bump(f'post:{instance.post_id}')
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow_pages(sender, instance, **kwargs):
+    bump(f'author:{instance.author.username}')
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, **kwargs):
+    get_backend().index(instance)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    get_backend().remove(instance.pk)
+
+
+@receiver(pre_save, sender=Post)
+def remember_image(sender, instance, **kwargs):
+    instance.previous_image = ''
+    if instance.pk is not None:
+        instance.previous_image = Post.objects.filter(
+            pk=instance.pk).values_list('image', flat=True).first() or ''
+
+
+@receiver(post_save, sender=Post)
+def count_image_references(sender, instance, **kwargs):
+    previous = getattr(instance, 'previous_image', '')
+    if instance.image.name == previous:
+        return
+    if instance.image:
+        storage.acquire(instance.image.name)
+    if previous:
+        storage.release(instance.image.storage, previous)
+
+
+@receiver(post_delete, sender=Post)
+def release_image(sender, instance, **kwargs):
+    if instance.image:
+        storage.release(instance.image.storage, instance.image.name)
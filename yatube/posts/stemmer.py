@@ -0,0 +1,121 @@
+'''Стеммер Портера (Snowball) для русского языка.
+
+Окончания перечислены в порядке убывания длины, чтобы первым
+срабатывало самое длинное совпадение, как требует алгоритм.
+'''
+VOWELS = 'аеиоуыэюя'
+
+PERFECTIVE_GERUND = (
+    ('вшись', 'вши', 'в'),
+    ('ившись', 'ывшись', 'ивши', 'ывши', 'ив', 'ыв'),
+)
+ADJECTIVE = (
+    'ими', 'ыми', 'его', 'ого', 'ему', 'ому', 'ее', 'ие', 'ые', 'ое',
+    'ей', 'ий', 'ый', 'ой', 'ем', 'им', 'ым', 'ом', 'их', 'ых', 'ую',
+    'юю', 'ая', 'яя', 'ою', 'ею',
+)
+PARTICIPLE = (
+    ('ем', 'нн', 'вш', 'ющ', 'щ'),
+    ('ивш', 'ывш', 'ующ'),
+)
+REFLEXIVE = ('ся', 'сь')
+VERB = (
+    ('ете', 'йте', 'ешь', 'нно', 'ла', 'на', 'ли', 'ем', 'ло', 'но', 'ет',
+     'ют', 'ны', 'ть', 'й', 'л', 'н'),
+    ('ейте', 'уйте', 'ила', 'ыла', 'ена', 'ите', 'или', 'ыли', 'ило',
+     'ыло', 'ено', 'ует', 'уют', 'ены', 'ить', 'ыть', 'ишь', 'ей', 'уй',
+     'ил', 'ыл', 'им', 'ым', 'ен', 'ят', 'ит', 'ыт', 'ую', 'ю'),
+)
+NOUN = (
+    'иями', 'ями', 'ами', 'ией', 'иям', 'ием', 'иях', 'ев', 'ов', 'ие',
+    'ье', 'еи', 'ии', 'ей', 'ой', 'ий', 'ям', 'ем', 'ам', 'ом', 'ах',
+    'ях', 'ию', 'ью', 'ия', 'ья', 'а', 'е', 'и', 'й', 'о', 'у', 'ы', 'ь',
+    'ю', 'я',
+)
+SUPERLATIVE = ('ейше', 'ейш')
+DERIVATIONAL = ('ость', 'ост')
+
+
+def regions(word):
+    '''Начала областей RV и R2'''
+    rv = len(word)
+    for i, char in enumerate(word):
+        if char in VOWELS:
+            rv = i + 1
+            break
+    r1 = r2 = len(word)
+    for i in range(1, len(word)):
+        if word[i - 1] in VOWELS and word[i] not in VOWELS:
+            r1 = i + 1
+            break
+    for i in range(r1 + 1, len(word)):
+        if word[i - 1] in VOWELS and word[i] not in VOWELS:
+            r2 = i + 1
+            break
+    return rv, r2
+
+
+def strip(word, start, endings):
+    '''Отрезает самое длинное окончание, если оно лежит в области start'''
+    for ending in endings:
+        if word.endswith(ending):
+            if len(word) - len(ending) >= start:
+                return word[:-len(ending)]
+            return None
+    return None
+
+
+def strip_after_a(word, start, groups):
+    '''Окончания первой группы допустимы только после «а» или «я»'''
+    first, second = groups
+    for ending in sorted(first + second, key=len, reverse=True):
+        if not word.endswith(ending):
+            continue
+        stem = word[:-len(ending)]
+        if ending in first and stem[-1:] not in ('а', 'я'):
+            continue
+        if len(stem) >= start:
+            return stem
+        return None
+    return None
+
+
+def strip_adjectival(word, start):
+    stem = strip(word, start, ADJECTIVE)
+    if stem is None:
+        return None
+    return strip_after_a(stem, start, PARTICIPLE) or stem
+
+
+def stem(word):
+    word = word.lower().replace('ё', 'е')
+    rv, r2 = regions(word)
+    if rv >= len(word):
+        return word
+
+    result = strip_after_a(word, rv, PERFECTIVE_GERUND)
+    if result is None:
+        word = strip(word, rv, REFLEXIVE) or word
+        result = (
+            strip_adjectival(word, rv)
+            or strip_after_a(word, rv, VERB)
+            or strip(word, rv, NOUN)
+        )
+    word = result or word
+
+    if word.endswith('и') and len(word) - 1 >= rv:
+        word = word[:-1]
+
+    word = strip(word, r2, DERIVATIONAL) or word
+
+    if word.endswith('нн') and len(word) - 2 >= rv:
+        return word[:-1]
+    superlative = strip(word, rv, SUPERLATIVE)
+    if superlative is not None:
+        word = superlative
+        if word.endswith('нн') and len(word) - 2 >= rv:
+            word = word[:-1]
+        return word
+    if word.endswith('ь') and len(word) - 1 >= rv:
+        word = word[:-1]
+    return word
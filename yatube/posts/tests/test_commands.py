@@ -0,0 +1,234 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from sorl.thumbnail.models import KVStore
+
+from core.models import Task
+
+from .. import bulk
+from ..management.commands import check_query_plans
+from ..models import Follow, Group, Post, TimelineEntry
+from ..search import search_posts
+
+User = get_user_model()
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+class CheckQueryPlansTest(TestCase):
+    def test_listing_queries_use_indexes(self):
+        """Запросы списков не читают таблицу целиком с сортировкой"""
+        out = StringIO()
+        call_command('check_query_plans', stdout=out)
+        self.assertNotIn('FAIL', out.getvalue())
+
+    def test_sort_fails_even_with_index_search(self):
+        """Сортировка во временном B-дереве — ошибка и без полного просмотра"""
+        plan = ('SEARCH posts_timelineentry USING INDEX x (user_id=?)\n'
+                'USE TEMP B-TREE FOR ORDER BY')
+        self.assertTrue(check_query_plans.sorts(plan))
+        self.assertTrue(check_query_plans.sorts(
+            'USE TEMP B-TREE FOR RIGHT PART OF ORDER BY'))
+        self.assertFalse(check_query_plans.sorts(
+            'SEARCH posts_post USING INDEX post_pub_date_idx (pub_date<?)'))
+
+
+class ImportExportTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.media = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+        shutil.rmtree(self.media, ignore_errors=True)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def test_import_runs_post_side_effects(self):
+        """Импорт пачками обновляет счётчики, ленты и поиск"""
+        with open(self.path('posts.ndjson'), 'w') as source:
+            for number in range(5):
+                source.write(json.dumps({
+                    'author': 'author', 'group': 'group',
+                    'text': f'Импортированный пост {number}',
+                    'pub_date': '2020-01-0{}T10:00:00+00:00'.format(
+                        number + 1),
+                }) + '\n')
+            source.write(json.dumps({'author': 'nobody', 'text': 'x'}) + '\n')
+        err = StringIO()
+        call_command('import_posts', self.path('posts.ndjson'),
+                     batch_size=2, stdout=StringIO(), stderr=err)
+        self.assertIn('строка 6', err.getvalue())
+        self.assertEqual(Post.objects.count(), 5)
+        self.assertEqual(Post.objects.first().pub_date.day, 5)
+        self.author.stats.refresh_from_db()
+        self.group.refresh_from_db()
+        self.assertEqual(self.author.stats.posts_count, 5)
+        self.assertEqual(self.group.posts_count, 5)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 5)
+        self.assertEqual(search_posts('импортированные').count(), 5)
+
+    def test_import_skips_malformed_lines(self):
+        """Испорченные строки NDJSON пропускаются с номером строки"""
+        with open(self.path('posts.ndjson'), 'w') as source:
+            source.write(json.dumps({'author': 'author', 'text': 'Один'})
+                         + '\n{"author": \n[1, 2]\n\n')
+            source.write(json.dumps({'author': 'author', 'text': 'Два'})
+                         + '\n')
+        err = StringIO()
+        call_command('import_posts', self.path('posts.ndjson'),
+                     batch_size=2, stdout=StringIO(), stderr=err)
+        self.assertCountEqual(Post.objects.values_list('text', flat=True),
+                              ['Один', 'Два'])
+        self.assertIn('строка 2: неверный JSON', err.getvalue())
+        self.assertIn('строка 3: ожидался объект JSON', err.getvalue())
+
+    def test_import_skips_posts_inserted_concurrently(self):
+        """Работа сигналов не повторяется для чужих постов той же пачки"""
+        explicit_dates = bulk.explicit_dates
+
+        @contextmanager
+        def concurrent_insert(*fields):
+            Post.objects.bulk_create(
+                [Post(author=self.author, text='Чужой пост')])
+            with explicit_dates(*fields):
+                yield
+
+        with open(self.path('posts.ndjson'), 'w') as source:
+            source.write(json.dumps(
+                {'author': 'author', 'text': 'Свой пост'}) + '\n')
+        with mock.patch.object(bulk, 'explicit_dates', concurrent_insert):
+            call_command('import_posts', self.path('posts.ndjson'),
+                         stdout=StringIO())
+        self.assertEqual(Post.objects.count(), 2)
+        self.assertEqual(
+            list(TimelineEntry.objects.values_list('post__text', flat=True)),
+            ['Свой пост'])
+        self.assertEqual(search_posts('чужой').count(), 0)
+
+    def test_export_import_round_trip_csv(self):
+        """Выгрузка в CSV с картинками загружается обратно"""
+        with override_settings(MEDIA_ROOT=self.media):
+            os.makedirs(os.path.join(self.media, 'posts'))
+            with open(os.path.join(self.media, 'posts', 'small.gif'),
+                      'wb') as image:
+                image.write(SMALL_GIF)
+            Post.objects.create(author=self.author, group=self.group,
+                                text='С картинкой', image='posts/small.gif')
+            Post.objects.create(author=self.author, text='Без группы')
+            images = self.path('images')
+            call_command('export_posts', self.path('posts.csv'),
+                         images_dir=images, stdout=StringIO())
+            Post.objects.all().delete()
+            call_command('import_posts', self.path('posts.csv'),
+                         images_dir=images, stdout=StringIO())
+            posts = Post.objects.order_by('pk')
+            self.assertEqual(
+                [(post.text, post.group) for post in posts],
+                [('С картинкой', self.group), ('Без группы', None)],
+            )
+            self.assertTrue(posts[0].image.storage.exists(posts[0].image.name))
+            self.assertEqual(
+                (posts[0].image_width, posts[0].image_height), (2, 1))
+        self.assertTrue(Task.objects.filter(
+            name='posts.thumbnails.generate').exists())
+
+
+class BackfillImageMetadataTest(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+
+    def test_backfill_fills_metadata_for_every_post_of_a_file(self):
+        """Метаданные заполняются для всех постов с одной картинкой"""
+        author = User.objects.create_user(username='backfill')
+        with override_settings(MEDIA_ROOT=self.media):
+            os.makedirs(os.path.join(self.media, 'posts'))
+            with open(os.path.join(self.media, 'posts', 'old.gif'),
+                      'wb') as image:
+                image.write(SMALL_GIF)
+            for number in range(3):
+                Post.objects.create(author=author, text=f'Пост {number}',
+                                    image='posts/old.gif')
+            Post.objects.create(author=author, text='Потерянный',
+                                image='posts/missing.gif')
+            err = StringIO()
+            call_command('backfill_image_metadata', batch_size=2,
+                         workers=2, stdout=StringIO(), stderr=err)
+        self.assertEqual(
+            set(Post.objects.filter(image='posts/old.gif').values_list(
+                'image_width', 'image_height', 'image_size')),
+            {(2, 1, len(SMALL_GIF))},
+        )
+        self.assertEqual(
+            len(Post.objects.get(text='Потерянный').image_placeholder), 0)
+        self.assertIn('posts/missing.gif', err.getvalue())
+
+
+class GcMediaTest(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+
+    def make(self, name, age=2 * 60 * 60):
+        path = os.path.join(self.media, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as image:
+            image.write(SMALL_GIF)
+        moment = time.time() - age
+        os.utime(path, (moment, moment))
+        return path
+
+    def test_removes_only_unreferenced_files(self):
+        """Удаляются старые файлы без постов вместе с их миниатюрами"""
+        author = User.objects.create_user(username='gc')
+        Post.objects.create(author=author, text='Живой',
+                            image='posts/ab/cd/live.gif')
+        kept = [
+            self.make('posts/ab/cd/live.gif'),
+            self.make('posts/ab/cd/live_960x339.jpg'),
+            self.make('posts/fresh.gif', age=0),
+        ]
+        removed = [
+            self.make('posts/ab/cd/dead.gif'),
+            self.make('posts/ab/cd/dead_480x170.jpg'),
+            self.make('posts/orphan.png'),
+            self.make('cache/0a/1b/0a1b2c.jpg'),
+        ]
+        KVStore.objects.create(key='sorl-thumbnail||image||0a1b', value='{}')
+        with override_settings(MEDIA_ROOT=self.media):
+            out = StringIO()
+            call_command('gc_media', dry_run=True, batch_size=2, stdout=out)
+            self.assertIn('posts/orphan.png', out.getvalue())
+            self.assertTrue(all(map(os.path.exists, kept + removed)))
+            call_command('gc_media', batch_size=2, stdout=StringIO())
+        self.assertTrue(all(map(os.path.exists, kept)))
+        self.assertFalse(any(map(os.path.exists, removed)))
+        self.assertFalse(KVStore.objects.exists())
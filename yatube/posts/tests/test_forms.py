@@ -1,11 +1,19 @@
 import shutil
 import tempfile
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO, StringIO
+from unittest import mock
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from core.models import Task
+from PIL import Image
+from posts import images, thumbnails
 from posts.forms import CommentForm, PostForm
 from posts.models import Comment, Group, Post
 
@@ -143,3 +151,147 @@ class CommentFormTest(TestCase):
                                    post=self.post,
                                    author=self.post.author).exists()
         )
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_thumbnails_generated_next_to_original(self):
+        """Миниатюры сохраняются рядом с оригиналом и попадают в шаблон"""
+        user = User.objects.create_user(username='thumb_user')
+        client = Client()
+        client.force_login(user)
+        image = BytesIO()
+        Image.new('RGB', (100, 50), 'red').save(image, 'PNG')
+        client.post(reverse('posts:post_create'), data={
+            'text': 'Пост с картинкой',
+            'image': SimpleUploadedFile('thumb.png', image.getvalue(),
+                                        content_type='image/png'),
+        })
+        post = Post.objects.get(author=user)
+        self.assertFalse(post.thumbnails_ready)
+        self.assertTrue(Task.objects.filter(
+            name='posts.thumbnails.generate').exists())
+        profile = reverse('posts:profile', kwargs={'username': user.username})
+        for _ in range(2):
+            self.assertNotContains(
+                self.client.get(profile), thumbnails.variant_name(
+                    post.image.name, settings.POST_THUMBNAIL_SIZES['card']))
+        thumbnails.generate(post.pk, post.image.name)
+        post.refresh_from_db()
+        self.assertTrue(post.thumbnails_ready)
+        for label, size in settings.POST_THUMBNAIL_SIZES.items():
+            with self.subTest(label=label):
+                name = thumbnails.variant_name(post.image.name, size)
+                with default_storage.open(name) as variant:
+                    self.assertEqual(Image.open(variant).size, size)
+        response = client.get(reverse('posts:post_detail',
+                                      kwargs={'post_id': post.pk}))
+        self.assertContains(response, post.thumbnails['card'])
+        self.assertContains(self.client.get(profile),
+                            post.thumbnails['card'])
+
+    def test_generate_thumbnails_command_schedules_old_posts(self):
+        """Команда ставит в очередь нарезку для постов без копий"""
+        user = User.objects.create_user(username='old_thumbs')
+        for number in range(3):
+            Post.objects.create(author=user, text=f'Старый {number}',
+                                image=f'posts/old{number}.png')
+        Post.objects.create(author=user, text='Без картинки')
+        call_command('generate_thumbnails', batch_size=2, stdout=StringIO())
+        self.assertEqual(Task.objects.filter(
+            name='posts.thumbnails.generate').count(), 3)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageProcessingTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def upload(self, image, name='photo.jpg', **params):
+        buffer = BytesIO()
+        image.save(buffer, 'JPEG', **params)
+        form = PostForm(data={'text': 'Пост с фото'}, files={
+            'image': SimpleUploadedFile(name, buffer.getvalue(),
+                                        content_type='image/jpeg'),
+        })
+        self.assertTrue(form.is_valid(), form.errors)
+        image = form.cleaned_data['image']
+        image.seek(0)
+        return image, Image.open(image)
+
+    @override_settings(POST_IMAGE_MAX_SIZE=(200, 200))
+    def test_large_image_downscaled(self):
+        """Большая картинка уменьшается с сохранением пропорций"""
+        upload, image = self.upload(Image.new('RGB', (800, 400), 'blue'))
+        self.assertEqual(image.size, (200, 100))
+        self.assertTrue(upload.name.startswith('photo.'))
+
+    def test_metadata_saved_and_rendered(self):
+        """Размеры и заглушка сохраняются и выводятся без чтения файла"""
+        user = User.objects.create_user(username='meta_user')
+        client = Client()
+        client.force_login(user)
+        image = BytesIO()
+        Image.new('RGB', (120, 80), (200, 100, 50)).save(image, 'PNG')
+        client.post(reverse('posts:post_create'), data={
+            'text': 'Пост с размерами',
+            'image': SimpleUploadedFile('meta.png', image.getvalue(),
+                                        content_type='image/png'),
+        })
+        post = Post.objects.get(author=user)
+        self.assertEqual((post.image_width, post.image_height), (120, 80))
+        self.assertEqual(post.image_size, post.image.size)
+        self.assertEqual(len(post.image_placeholder), 28)
+        response = client.get(reverse('posts:profile',
+                                      kwargs={'username': user.username}))
+        self.assertContains(response, 'width="120" height="80"')
+        self.assertContains(response, 'loading="lazy"')
+        self.assertContains(response, post.image_placeholder)
+
+    def test_broken_pool_recreated(self):
+        """Пул с погибшим процессом пересоздаётся, загрузка проходит"""
+        broken = mock.Mock()
+        broken.submit.side_effect = BrokenProcessPool
+        working = mock.Mock()
+        working.submit.side_effect = (
+            lambda func, *args: mock.Mock(result=lambda: func(*args)))
+        with mock.patch.object(images, 'executor', broken), \
+                mock.patch.object(images, 'ProcessPoolExecutor',
+                                  return_value=working):
+            _, image = self.upload(Image.new('RGB', (40, 20), 'green'))
+            self.assertIs(images.executor, working)
+        self.assertEqual(image.size, (40, 20))
+        broken.shutdown.assert_called_once_with(wait=False)
+
+    @override_settings(POST_IMAGE_WORKERS=0)
+    def test_unprocessable_image_is_form_error(self):
+        """Ошибка Pillow при обработке становится ошибкой формы"""
+        buffer = BytesIO()
+        Image.new('RGB', (10, 10)).save(buffer, 'PNG')
+        errors = (OSError('truncated'), Image.DecompressionBombError('bomb'))
+        for error in errors:
+            with self.subTest(error=error), \
+                    mock.patch.object(images, 'process', side_effect=error):
+                form = PostForm(data={'text': 'Пост'}, files={
+                    'image': SimpleUploadedFile('bad.png', buffer.getvalue(),
+                                                content_type='image/png'),
+                })
+                self.assertFalse(form.is_valid())
+                self.assertIn('image', form.errors)
+
+    def test_exif_orientation_applied_and_stripped(self):
+        """Поворот из EXIF применяется, метаданные не сохраняются"""
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        exif[0x010F] = 'Камера'
+        _, image = self.upload(Image.new('RGB', (60, 30), 'red'),
+                               exif=exif.tobytes())
+        self.assertEqual(image.size, (30, 60))
+        self.assertEqual(dict(image.getexif()), {})
@@ -2,7 +2,8 @@ from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.test import TestCase
 
-from ..models import Group, Post
+from .. import counters
+from ..models import AuthorStats, Comment, Follow, Group, Post
 
 User = get_user_model()
 
@@ -29,3 +30,74 @@ class PostModelTest(TestCase):
 
         group = self.group
         self.assertEqual(str(group), group.title)
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+
+    def test_counters_follow_creates_and_deletes(self):
+        """Счётчики меняются при создании и удалении записей"""
+        post = Post.objects.create(author=self.author, text='Текст',
+                                   group=self.group)
+        comment = Comment.objects.create(post=post, author=self.reader,
+                                         text='Комментарий')
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.author.stats.refresh_from_db()
+        self.reader.stats.refresh_from_db()
+        self.group.refresh_from_db()
+        self.assertEqual(self.author.stats.posts_count, 1)
+        self.assertEqual(self.author.stats.followers_count, 1)
+        self.assertEqual(self.reader.stats.comments_count, 1)
+        self.assertEqual(self.reader.stats.following_count, 1)
+        self.assertEqual(self.group.posts_count, 1)
+        follow.delete()
+        comment.delete()
+        post.delete()
+        self.author.stats.refresh_from_db()
+        self.reader.stats.refresh_from_db()
+        self.group.refresh_from_db()
+        self.assertEqual(self.author.stats.posts_count, 0)
+        self.assertEqual(self.author.stats.followers_count, 0)
+        self.assertEqual(self.reader.stats.comments_count, 0)
+        self.assertEqual(self.reader.stats.following_count, 0)
+        self.assertEqual(self.group.posts_count, 0)
+
+    def test_group_change_moves_counter(self):
+        """Перенос поста в другую группу переносит счётчик"""
+        post = Post.objects.create(author=self.author, text='Текст',
+                                   group=self.group)
+        post.group = None
+        post.save()
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 0)
+
+    def test_reconcile_repairs_drift(self):
+        """Пересчёт исправляет разошедшиеся счётчики"""
+        Post.objects.create(author=self.author, text='Текст',
+                            group=self.group)
+        AuthorStats.objects.filter(user=self.author).update(posts_count=7)
+        Group.objects.filter(pk=self.group.pk).update(posts_count=7)
+        self.assertEqual(counters.reconcile(), (1, 1))
+        self.assertEqual(AuthorStats.objects.get(user=self.author).posts_count,
+                         1)
+        self.assertEqual(Group.objects.get(pk=self.group.pk).posts_count, 1)
+
+    def test_drifted_zero_counter_does_not_block_delete(self):
+        """Удаление не падает, если счётчик уже разошёлся до нуля"""
+        post = Post.objects.create(author=self.author, text='Текст',
+                                   group=self.group)
+        AuthorStats.objects.filter(user=self.author).update(posts_count=0)
+        Group.objects.filter(pk=self.group.pk).update(posts_count=0)
+        post.delete()
+        self.assertEqual(AuthorStats.objects.get(user=self.author).posts_count,
+                         0)
+        self.assertEqual(Group.objects.get(pk=self.group.pk).posts_count, 0)
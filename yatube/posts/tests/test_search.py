@@ -0,0 +1,74 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Post
+from ..search import search_posts
+from ..stemmer import stem
+from ..utils import NUM_OF_POSTS
+
+User = get_user_model()
+
+
+class StemmerTest(TestCase):
+    def test_word_forms_share_stem(self):
+        """Разные формы слова приводятся к одной основе."""
+        self.assertEqual(stem('кошка'), stem('кошкам'))
+        self.assertEqual(stem('тестовый'), stem('тестовые'))
+        self.assertEqual(stem('бежали'), stem('бежал'))
+
+
+class SearchTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    def setUp(self):
+        self.guest_client = Client()
+        self.cats = Post.objects.create(
+            author=self.user, text='Кошки гуляют по крышам')
+        self.dogs = Post.objects.create(
+            author=self.user, text='Собака гуляла во дворе')
+
+    def test_search_matches_word_forms(self):
+        """Поиск находит посты по другим формам слова."""
+        self.assertEqual(list(search_posts('кошкам')[:10]), [self.cats])
+        self.assertCountEqual(search_posts('гулять')[:10],
+                              [self.cats, self.dogs])
+        self.assertEqual(search_posts('кошка собака').count(), 0)
+
+    def test_index_follows_edits_and_deletes(self):
+        """Индекс обновляется при изменении и удалении поста."""
+        self.dogs.text = 'Кошка спит'
+        self.dogs.save()
+        self.assertEqual(search_posts('собака').count(), 0)
+        self.assertEqual(search_posts('кошка').count(), 2)
+        self.cats.delete()
+        self.assertEqual(search_posts('кошка').count(), 1)
+
+    def test_rebuild_command_indexes_existing_posts(self):
+        """Команда rebuild_search_index индексирует посты без записи."""
+        Post.objects.bulk_create([Post(author=self.user, text='Кошка ловит')])
+        self.assertEqual(search_posts('ловить').count(), 0)
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(search_posts('ловить').count(), 1)
+        self.assertEqual(search_posts('кошка').count(), 2)
+
+    def test_search_page_keeps_query_in_pagination(self):
+        """Страница поиска выводит результаты и сохраняет q в ссылках."""
+        Post.objects.bulk_create(
+            Post(author=self.user, text=f'Кошка номер {i}')
+            for i in range(NUM_OF_POSTS))
+        for post in Post.objects.filter(text__startswith='Кошка номер'):
+            post.save()
+        response = self.guest_client.get(reverse('posts:search'),
+                                         {'q': 'кошка'})
+        self.assertEqual(len(response.context['page_obj']), NUM_OF_POSTS)
+        self.assertContains(response, 'q=%D0%BA%D0%BE%D1%88%D0%BA%D0%B0')
+        second = self.guest_client.get(reverse('posts:search'),
+                                       {'q': 'кошка', 'page': 2})
+        self.assertEqual(len(second.context['page_obj']), 1)
@@ -0,0 +1,20 @@
+from django.test import TestCase
+
+from ..utils import page_window
+
+
+class PageWindowTest(TestCase):
+    def test_window_elides_distant_pages(self):
+        """Окно содержит края и соседей текущей страницы."""
+        cases = {
+            (1, 1): [1],
+            (1, 5): [1, 2, 3, 4, 5],
+            (5, 10000): [1, 2, 3, 4, 5, 6, 7, 8, None, 10000],
+            (5000, 10000): [1, None, 4997, 4998, 4999, 5000, 5001, 5002,
+                            5003, None, 10000],
+            (10000, 10000): [1, None, 9997, 9998, 9999, 10000],
+            (6, 12): [1, 2, 3, 4, 5, 6, 7, 8, 9, None, 12],
+        }
+        for (number, num_pages), expected in cases.items():
+            with self.subTest(number=number, num_pages=num_pages):
+                self.assertEqual(page_window(number, num_pages), expected)
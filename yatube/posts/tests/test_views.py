@@ -1,17 +1,27 @@
+import json
 import shutil
 import tempfile
+import time
+from unittest import mock
 
 from django import forms
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
 from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
+from core.tasks import claim, execute
+
+from .. import follows, timeline
 from ..forms import PostForm
-from ..models import Follow, Group, Post
-from ..utils import NUM_OF_POSTS
+from ..models import (AuthorStats, Comment, Follow, Group, Post,
+                      TimelineEntry)
+from ..utils import NUM_OF_COMMENTS, NUM_OF_POSTS, CursorPaginator
+from .utils import QueryBudgetMixin
 
 User = get_user_model()
 
@@ -55,19 +65,75 @@ class PostViewsTests(TestCase):
         shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
 
     def setUp(self):
+        cache.clear()
         self.guest_client = Client()
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
 
     def test_index_page_cache(self):
-        """Проверка работы кэша на главной странице"""
-        response_1 = self.authorized_client.get(reverse('posts:index'))
-        Post.objects.get(id=self.post.id).delete()
-        response_2 = self.authorized_client.get(reverse('posts:index'))
+        """Главная страница отдаётся из кэша до изменения постов"""
+        response_1 = self.guest_client.get(reverse('posts:index'))
+        response_2 = self.guest_client.get(reverse('posts:index'))
+        self.assertIsNone(response_2.context)
         self.assertEqual(response_1.content, response_2.content)
-        cache.clear()
-        response_3 = self.authorized_client.get(reverse('posts:index'))
-        self.assertNotEqual(response_1, response_3)
+        Post.objects.get(id=self.post.id).delete()
+        response_3 = self.guest_client.get(reverse('posts:index'))
+        self.assertNotEqual(response_1.content, response_3.content)
+        self.assertNotIn(self.post, response_3.context['page_obj'])
+
+    def test_page_cache_keyed_by_page(self):
+        """Разные страницы списка кэшируются под разными ключами"""
+        for i in range(NUM_OF_POSTS):
+            Post.objects.create(author=self.user, text=f'Текст {i}')
+        first = self.guest_client.get(reverse('posts:index'))
+        second = self.guest_client.get(reverse('posts:index'), {'page': 2})
+        self.assertNotEqual(first.content, second.content)
+        self.assertIn(self.post, second.context['page_obj'])
+
+    def test_comment_invalidates_post_page(self):
+        """Новый комментарий сбрасывает кэш только страницы поста"""
+        detail = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        self.guest_client.get(detail)
+        self.guest_client.get(reverse('posts:index'))
+        Comment.objects.create(post=self.post, author=self.user,
+                               text='Комментарий')
+        self.assertIsNotNone(self.guest_client.get(detail).context)
+        self.assertIsNone(
+            self.guest_client.get(reverse('posts:index')).context)
+
+    def test_group_and_user_changes_invalidate_pages(self):
+        """Переименование группы и автора обновляет кэшированные страницы"""
+        detail = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        index = reverse('posts:index')
+        self.guest_client.get(detail)
+        self.guest_client.get(index)
+        group = Group.objects.get(pk=self.group.pk)
+        group.title = 'Новое название'
+        group.save()
+        self.assertContains(self.guest_client.get(detail), 'Новое название')
+        user = User.objects.get(pk=self.user.pk)
+        user.first_name = 'Иван'
+        user.save()
+        self.assertContains(self.guest_client.get(index), 'Иван')
+        group.delete()
+        self.assertNotContains(self.guest_client.get(detail),
+                               'все записи группы')
+
+    def test_login_keeps_pages_cached(self):
+        """Вход пользователя не сбрасывает кэш страниц"""
+        self.guest_client.get(reverse('posts:index'))
+        Client().force_login(self.user)
+        self.assertIsNone(
+            self.guest_client.get(reverse('posts:index')).context)
+
+    def test_process_local_cache_short_and_without_validators(self):
+        """Кэш в памяти процесса хранит страницы недолго и без ETag"""
+        with mock.patch('core.cache.cache.set') as cache_set:
+            response = self.guest_client.get(reverse('posts:index'))
+        self.assertNotIn('ETag', response)
+        self.assertNotIn('Last-Modified', response)
+        self.assertEqual(cache_set.call_args[0][2],
+                         settings.PAGE_CACHE_LOCAL_TIMEOUT)
 
     def test_pages_uses_correct_template(self):
         """URL-адрес использует соответствующий шаблон."""
@@ -187,6 +253,83 @@ class PostViewsTests(TestCase):
         self.assertIn(post_new, profile, 'Поста нет в группе')
 
 
+SHARED_CACHE_DIR = tempfile.mkdtemp()
+
+
+@override_settings(CACHES={'default': {
+    'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+    'LOCATION': SHARED_CACHE_DIR,
+}})
+class ConditionalGetTests(TestCase):
+    """Валидаторы страниц при кэше, общем для всех процессов"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='NoName')
+        cls.post = Post.objects.create(author=cls.user, text='Текст')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(SHARED_CACHE_DIR, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def clock(self, seconds):
+        """Подменяет часы поколений кэша: seconds после начала теста"""
+        start = getattr(self, 'clock_start', None)
+        if start is None:
+            start = self.clock_start = (
+                (time.time_ns() // 10 ** 9 + 10) * 10 ** 9 + 3 * 10 ** 8)
+        return mock.patch('core.cache.time.time_ns',
+                          return_value=start + int(seconds * 10 ** 9))
+
+    def test_conditional_get(self):
+        """Повторный запрос с валидаторами получает 304 до изменений"""
+        detail = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        with self.clock(0):
+            self.guest_client.get(detail)
+        with self.clock(1):
+            response = self.guest_client.get(detail)
+            etag = response['ETag']
+            not_modified = self.guest_client.get(
+                detail, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(not_modified.status_code, 304)
+            self.assertEqual(not_modified['ETag'], etag)
+            self.assertEqual(self.guest_client.get(
+                detail, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+            ).status_code, 304)
+            Comment.objects.create(post=self.post, author=self.user,
+                                   text='Комментарий')
+            changed = self.guest_client.get(detail, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(changed.status_code, 200)
+            self.assertNotEqual(changed['ETag'], etag)
+
+    def test_last_modified_within_same_second(self):
+        """Изменение в ту же секунду не даёт 304 по If-Modified-Since"""
+        detail = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        with self.clock(0):
+            Comment.objects.create(post=self.post, author=self.user,
+                                   text='Первый')
+            self.assertNotIn('Last-Modified', self.guest_client.get(detail))
+        with self.clock(1):
+            seen = self.guest_client.get(detail)['Last-Modified']
+        with self.clock(1.5):
+            Comment.objects.create(post=self.post, author=self.user,
+                                   text='Второй')
+            self.assertEqual(self.guest_client.get(
+                detail, HTTP_IF_MODIFIED_SINCE=seen).status_code, 200)
+        with self.clock(3):
+            self.assertEqual(self.guest_client.get(
+                detail, HTTP_IF_MODIFIED_SINCE=seen).status_code, 200)
+            fresh = self.guest_client.get(detail)['Last-Modified']
+            self.assertEqual(self.guest_client.get(
+                detail, HTTP_IF_MODIFIED_SINCE=fresh).status_code, 304)
+
+
 class FollowViewTest(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -199,6 +342,7 @@ class FollowViewTest(TestCase):
         )
 
     def setUp(self):
+        cache.clear()
         self.authorized_client = Client()
         self.authorized_client.force_login(self.follower)
 
@@ -226,6 +370,77 @@ class FollowViewTest(TestCase):
         self.assertEqual(count_unfollow, 1)
         self.assertNotEqual(follow, unfollow)
 
+    def test_follow_is_idempotent(self):
+        """Повторная подписка не создаёт дубль и не сбивает счётчики"""
+        url = reverse('posts:profile_follow',
+                      kwargs={'username': self.author.username})
+        self.authorized_client.get(url)
+        self.authorized_client.get(url)
+        self.assertEqual(Follow.objects.count(), 1)
+        self.author.stats.refresh_from_db()
+        self.assertEqual(self.author.stats.followers_count, 1)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.follower, post=self.post).exists())
+
+    def test_follow_bulk(self):
+        """Пакетная подписка и отписка одним запросом"""
+        other = User.objects.create_user(username='Other')
+        Follow.objects.create(user=self.follower, author=other)
+        response = self.authorized_client.post(
+            reverse('posts:follow_bulk'),
+            data=json.dumps({
+                'follow': [self.author.username, 'nobody'],
+                'unfollow': [other.username],
+            }),
+            content_type='application/json',
+        )
+        self.assertEqual(response.json(), {
+            'followed': [self.author.username],
+            'unfollowed': [other.username],
+            'missing': ['nobody'],
+        })
+        self.assertEqual(
+            list(Follow.objects.values_list('author__username', flat=True)),
+            [self.author.username],
+        )
+        self.follower.stats.refresh_from_db()
+        self.assertEqual(self.follower.stats.following_count, 1)
+        bad = self.authorized_client.post(
+            reverse('posts:follow_bulk'), data='[1]',
+            content_type='application/json')
+        self.assertEqual(bad.status_code, 400)
+        for body in ({'follow': 'Other'}, {'unfollow': [1]}):
+            with self.subTest(body=body):
+                bad = self.authorized_client.post(
+                    reverse('posts:follow_bulk'), data=json.dumps(body),
+                    content_type='application/json')
+                self.assertEqual(bad.status_code, 400)
+
+    def test_follow_many_shifts_counters_by_new_follows(self):
+        """Пакетная подписка сдвигает счётчики только на новые подписки"""
+        other = User.objects.create_user(username='Other')
+        Follow.objects.create(user=self.follower, author=self.author)
+        AuthorStats.objects.filter(user=self.author).update(posts_count=99)
+        follows.follow_many(self.follower, [self.author, other])
+        counts = dict(AuthorStats.objects.filter(
+            user__in=[self.author, other, self.follower]
+        ).values_list('user__username', 'followers_count'))
+        self.assertEqual(counts, {'Author': 1, 'Other': 1, 'Follower': 0})
+        self.follower.stats.refresh_from_db()
+        self.assertEqual(self.follower.stats.following_count, 2)
+        self.assertEqual(
+            AuthorStats.objects.get(user=self.author).posts_count, 99)
+
+    @override_settings(TIMELINE_SYNC_FANOUT=1)
+    def test_large_backfill_queued(self):
+        """Большое число постов копируется в ленту фоновой задачей"""
+        Post.objects.create(text='Второй пост', author=self.author)
+        follows.follow_many(self.follower, [self.author])
+        self.assertFalse(TimelineEntry.objects.exists())
+        execute(claim())
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.follower).count(), 2)
+
     def test_follow_page(self):
         """Пост добавляется на страницу подписок"""
         Follow.objects.create(
@@ -237,6 +452,70 @@ class FollowViewTest(TestCase):
         follow = response.context['page_obj']
         self.assertIn(self.post, follow, 'Поста нет на странице подписчика')
 
+    def test_new_post_fanned_out_to_followers(self):
+        """Новый пост записывается в ленту подписчика и убирается отпиской"""
+        follow = Follow.objects.create(user=self.follower, author=self.author)
+        post_new = Post.objects.create(text='Новый текст', author=self.author)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.follower, post=post_new).exists())
+        follow.delete()
+        self.assertFalse(TimelineEntry.objects.filter(
+            user=self.follower).exists())
+
+    @override_settings(TIMELINE_CELEBRITY_FOLLOWERS=1)
+    def test_celebrity_posts_read_on_request(self):
+        """Посты знаменитостей не раскладываются, но попадают в ленту"""
+        Follow.objects.create(user=self.follower, author=self.author)
+        post_new = Post.objects.create(text='Новый текст', author=self.author)
+        self.assertFalse(TimelineEntry.objects.filter(post=post_new).exists())
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertIn(post_new, response.context['page_obj'])
+
+    @override_settings(TIMELINE_CELEBRITY_FOLLOWERS=2)
+    def test_celebrity_posts_kept_after_losing_followers(self):
+        """Посты знаменитости остаются в ленте, когда аудитория уменьшилась"""
+        other = User.objects.create_user(username='other_follower')
+        Follow.objects.create(user=self.follower, author=self.author)
+        Follow.objects.create(user=other, author=self.author)
+        loud = Post.objects.create(text='Громкий пост', author=self.author)
+        Follow.objects.filter(user=other).delete()
+        quiet = Post.objects.create(text='Тихий пост', author=self.author)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.follower, post=quiet).exists())
+        Follow.objects.create(user=other, author=self.author)
+        for reader in (self.follower, other):
+            with self.subTest(reader=reader.username):
+                feed = timeline.feed(reader)
+                self.assertIn(loud, feed)
+                self.assertIn(quiet, feed)
+
+    @override_settings(TIMELINE_CELEBRITY_FOLLOWERS=2)
+    def test_feed_pages_merge_entries_and_unfanned_posts(self):
+        """Страницы ленты сливают записи ленты и посты знаменитости"""
+        celebrity = User.objects.create_user(username='celebrity')
+        other = User.objects.create_user(username='other_follower')
+        Follow.objects.create(user=self.follower, author=self.author)
+        Follow.objects.create(user=self.follower, author=celebrity)
+        Follow.objects.create(user=other, author=celebrity)
+        for number in range(9):
+            Post.objects.create(text=f'Пост {number}',
+                                author=(self.author, celebrity)[number % 2])
+        expected = list(Post.objects.filter(
+            author__in=[self.author, celebrity]).values_list('pk', flat=True))
+        self.assertTrue(Post.objects.filter(fanned_out=False).exists())
+        paginator = CursorPaginator(timeline.feed(self.follower), 4)
+        page = paginator.get_page()
+        seen = [post.pk for post in page]
+        while page.has_next():
+            previous = page
+            page = CursorPaginator(timeline.feed(self.follower), 4).get_page(
+                page.next_page_number(), after=page.next_cursor)
+            seen += [post.pk for post in page]
+        self.assertEqual(seen, expected)
+        back = CursorPaginator(timeline.feed(self.follower), 4).get_page(
+            previous.number, before=page.previous_cursor)
+        self.assertEqual(list(back), list(previous))
+
 
 class PaginatorViewsTests(TestCase):
     @classmethod
@@ -257,6 +536,7 @@ class PaginatorViewsTests(TestCase):
             )
 
     def setUp(self):
+        cache.clear()
         self.guest_client = Client()
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
@@ -271,3 +551,145 @@ class PaginatorViewsTests(TestCase):
         response = self.authorized_client.get(reverse(
             'posts:profile', kwargs={'username': self.user.username}))
         self.assertEqual(len(response.context['page_obj']), NUM_OF_POSTS)
+
+    def test_cursor_next_and_previous_pages(self):
+        """Курсоры ведут на следующую и обратно на предыдущую страницу"""
+        first = self.guest_client.get(reverse('posts:index'))
+        first_page = first.context['page_obj']
+        self.assertTrue(first_page.has_next())
+        second = self.guest_client.get(reverse('posts:index'), {
+            'page': first_page.next_page_number(),
+            'after': first_page.next_cursor,
+        })
+        second_page = second.context['page_obj']
+        self.assertEqual(len(second_page), 15 - NUM_OF_POSTS)
+        self.assertFalse(second_page.has_next())
+        self.assertTrue(set(first_page).isdisjoint(second_page))
+        back = self.guest_client.get(reverse('posts:index'), {
+            'page': second_page.previous_page_number(),
+            'before': second_page.previous_cursor,
+        })
+        self.assertEqual(list(back.context['page_obj']), list(first_page))
+
+    def test_cursor_page_runs_no_count(self):
+        """Страница по курсору не считает все записи"""
+        first_page = self.guest_client.get(
+            reverse('posts:index')).context['page_obj']
+        with CaptureQueriesContext(connection) as queries:
+            self.guest_client.get(reverse('posts:index'), {
+                'page': 2, 'after': first_page.next_cursor,
+            })
+        self.assertFalse(any('COUNT(' in query['sql']
+                             for query in queries.captured_queries))
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='NoName')
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.group = Group.objects.create(
+            title='Тестовое название',
+            slug='test_slug',
+            description='Тестовое описание'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.user)
+        for i in range(NUM_OF_POSTS):
+            cls.post = Post.objects.create(
+                author=cls.user,
+                text='Тестовый текст' + str(i),
+                group=cls.group
+            )
+        for i in range(NUM_OF_POSTS):
+            Comment.objects.create(post=cls.post, author=cls.reader,
+                                   text='Комментарий' + str(i))
+
+    def setUp(self):
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def test_listing_query_budgets(self):
+        """Число запросов страниц не зависит от числа постов"""
+        budgets = {
+            reverse('posts:index'): 1,
+            reverse('posts:group_posts',
+                    kwargs={'slug': self.group.slug}): 2,
+            reverse('posts:profile',
+                    kwargs={'username': self.user.username}): 2,
+            reverse('posts:post_detail',
+                    kwargs={'post_id': self.post.id}): 3,
+        }
+        for url, budget in budgets.items():
+            with self.subTest(url=url):
+                self.assertQueryBudget(self.guest_client, url, budget)
+
+    def test_follow_index_query_budget(self):
+        """Лента подписок не делает запрос на каждый пост"""
+        self.assertQueryBudget(self.authorized_client,
+                               reverse('posts:follow_index'), 5)
+
+    def test_profile_follow_state_query_budget(self):
+        """Подписка проверяется в том же запросе, что и автор"""
+        response = self.assertQueryBudget(
+            self.authorized_client,
+            reverse('posts:profile', kwargs={'username': self.user.username}),
+            4,
+        )
+        self.assertTrue(response.context['following'])
+
+
+class CommentPaginationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='NoName')
+        cls.post = Post.objects.create(author=cls.user, text='Текст')
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=cls.user, text=f'Комментарий {i}')
+            for i in range(NUM_OF_COMMENTS + 5)
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def texts(self, comments):
+        return [comment.text for comment in comments]
+
+    def test_post_detail_shows_first_page(self):
+        """На странице поста только первая страница комментариев"""
+        response = self.authorized_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}))
+        comments = response.context['comments']
+        self.assertEqual(len(comments), NUM_OF_COMMENTS)
+        self.assertEqual(comments[0].text, 'Комментарий 0')
+        self.assertContains(response, 'data-fragment=')
+
+    def test_fragment_continues_from_cursor(self):
+        """Фрагмент отдаёт следующую страницу по курсору"""
+        url = reverse('posts:post_comments', kwargs={'post_id': self.post.id})
+        first = self.authorized_client.get(
+            url, {'format': 'json', 'order': 'new'}).json()
+        self.assertEqual(first['results'][0]['text'],
+                         f'Комментарий {NUM_OF_COMMENTS + 4}')
+        second = self.authorized_client.get(
+            url, {'order': 'new', 'page': 2, 'after': first['next']})
+        self.assertEqual(
+            self.texts(second.context['comments']),
+            [f'Комментарий {i}' for i in range(4, -1, -1)],
+        )
+        self.assertNotContains(second, 'data-fragment=')
+
+    def test_ajax_comment_returns_fragment(self):
+        """AJAX-комментарий возвращает фрагмент вместо редиректа"""
+        url = reverse('posts:add_comment', kwargs={'post_id': self.post.id})
+        response = self.authorized_client.post(
+            url, {'text': 'Новый'}, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.status_code, 201)
+        self.assertContains(response, 'Новый', status_code=201)
+        invalid = self.authorized_client.post(
+            url, {'text': ''}, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(invalid.status_code, 400)
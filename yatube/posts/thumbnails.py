@@ -0,0 +1,78 @@
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+from core.tasks import task
+
+
+def variant_name(name, size):
+    '''Имя копии рядом с оригиналом: posts/a.png -> posts/a_960x339.jpg'''
+    root, _ = os.path.splitext(name)
+    width, height = size
+    return f'{root}_{width}x{height}.jpg'
+
+
+def variant_urls(name):
+    return {
+        label: default_storage.url(variant_name(name, size))
+        for label, size in settings.POST_THUMBNAIL_SIZES.items()
+    }
+
+
+def render_variants(name):
+    '''Один раз декодирует оригинал и сохраняет все размеры'''
+    with default_storage.open(name) as source:
+        image = Image.open(source)
+        image.load()
+    image = ImageOps.exif_transpose(image).convert('RGB')
+    for size in settings.POST_THUMBNAIL_SIZES.values():
+        variant = ImageOps.fit(image, size, Image.LANCZOS)
+        buffer = BytesIO()
+        variant.save(buffer, 'JPEG', quality=85, optimize=True)
+        target = variant_name(name, size)
+        if default_storage.exists(target):
+            default_storage.delete(target)
+        default_storage.save(target, ContentFile(buffer.getvalue()))
+
+
+@task()
+def generate(post_id, name):
+    '''Готовит копии и отмечает пост, если картинку не успели заменить.
+
+    update() не вызывает сигналы сохранения, поэтому страницы с постом
+    сбрасываются здесь: иначе кэш отдавал бы адрес оригинала.
+    '''
+    from .cache import invalidate_post
+    from .models import Post
+
+    render_variants(name)
+    updated = Post.objects.filter(pk=post_id, image=name).update(
+        thumbnails_ready=True)
+    if updated:
+        post = Post.objects.select_related('author', 'group').get(pk=post_id)
+        invalidate_post(post, [post.group.slug] if post.group_id else [])
+
+
+def schedule(post):
+    '''Ставит нарезку копий в очередь фоновых задач'''
+    generate.delay(post.pk, post.image.name)
+
+
+def backfill(posts, batch_size):
+    '''Ставит в очередь нарезку копий для постов без готовых копий'''
+    posts = posts.filter(thumbnails_ready=False).exclude(
+        image='').order_by('pk')
+    last = scheduled = 0
+    while True:
+        batch = list(posts.filter(pk__gt=last).values_list(
+            'pk', 'image')[:batch_size])
+        if not batch:
+            return scheduled
+        last = batch[-1][0]
+        for post_id, name in batch:
+            generate.delay(post_id, name)
+        scheduled += len(batch)
@@ -0,0 +1,210 @@
+import copy
+
+from django.conf import settings
+from django.db.models import Exists, OuterRef, Q, Sum
+from django.utils.functional import cached_property
+
+from core.tasks import task
+
+from .models import AuthorStats, Follow, Post, TimelineEntry
+
+BATCH_SIZE = 500
+KEY = ['pub_date', 'id']
+
+
+def followers_count(author_id):
+    return AuthorStats.objects.filter(user_id=author_id).values_list(
+        'followers_count', flat=True).first() or 0
+
+
+def write_entries(rows):
+    '''Вставляет строки (user_id, post_id, author_id, pub_date),
+    пропуская уже существующие'''
+    TimelineEntry.objects.bulk_create(
+        (TimelineEntry(user_id=user_id, post_id=post_id,
+                       author_id=author_id, pub_date=pub_date)
+         for user_id, post_id, author_id, pub_date in rows),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+@task()
+def write_post(post_id, author_id):
+    pub_date = Post.objects.filter(pk=post_id).values_list(
+        'pub_date', flat=True).first()
+    if pub_date is None:
+        return
+    followers = Follow.objects.filter(
+        author_id=author_id
+    ).values_list('user_id', flat=True).iterator()
+    write_entries((user_id, post_id, author_id, pub_date)
+                  for user_id in followers)
+
+
+def fan_out(post):
+    '''Раскладывает новый пост по лентам подписчиков автора.
+
+    Небольшие аудитории обновляются сразу, большие — фоновой задачей.
+    Посты знаменитостей не раскладываются и помечаются fanned_out=False:
+    решение хранится в посте, поэтому лента читает их при запросе и
+    после того, как аудитория автора уменьшится.
+    '''
+    followers = followers_count(post.author_id)
+    if followers >= settings.TIMELINE_CELEBRITY_FOLLOWERS:
+        if post.fanned_out:
+            post.fanned_out = False
+            Post.objects.filter(pk=post.pk).update(fanned_out=False)
+        return
+    if followers > settings.TIMELINE_SYNC_FANOUT:
+        write_post.delay(post.pk, post.author_id)
+    else:
+        write_post(post.pk, post.author_id)
+
+
+@task()
+def write_backfill(user_id, author_ids):
+    posts = Post.objects.filter(
+        author_id__in=author_ids, fanned_out=True
+    ).values_list('pk', 'author_id', 'pub_date').iterator()
+    write_entries((user_id, post_id, author_id, pub_date)
+                  for post_id, author_id, pub_date in posts)
+
+
+def backfill(user_id, *author_ids):
+    '''Добавляет в ленту подписчика разложенные посты авторов.
+
+    Как и в fan_out, до TIMELINE_SYNC_FANOUT записей пишутся сразу,
+    больше — фоновой задачей; число постов берётся из счётчиков.
+    '''
+    posts = AuthorStats.objects.filter(user_id__in=author_ids).aggregate(
+        total=Sum('posts_count'))['total'] or 0
+    if posts > settings.TIMELINE_SYNC_FANOUT:
+        write_backfill.delay(user_id, list(author_ids))
+    else:
+        write_backfill(user_id, list(author_ids))
+
+
+def prune(user_id, *author_ids):
+    '''Убирает из ленты посты авторов после отписки'''
+    TimelineEntry.objects.filter(
+        user_id=user_id, author_id__in=author_ids
+    ).delete()
+
+
+def entry_condition(condition):
+    '''Условие на ключ поста (pub_date, id) для записей ленты'''
+    entry = copy.copy(condition)
+    entry.children = []
+    for child in condition.children:
+        if isinstance(child, Q):
+            entry.children.append(entry_condition(child))
+            continue
+        lookup, value = child
+        field, separator, rest = lookup.partition('__')
+        if field == 'id':
+            field = 'post'
+        entry.children.append((field + separator + rest, value))
+    return entry
+
+
+class Feed:
+    '''Лента подписок, читаемая по ключу (pub_date, id) без сортировки.
+
+    Разложенные посты берутся из TimelineEntry по индексу
+    (user, -pub_date, -post), неразложенные — отдельным поиском по
+    индексу на каждого автора, у которого они есть. Из каждого
+    источника читается не больше строк, чем нужно срезу, и они
+    сливаются по ключу. Для CursorPaginator лента ведёт себя как
+    QuerySet: поддерживает order_by и reverse по ключу, filter с
+    условием на ключ и срезы.
+    '''
+
+    model = Post
+
+    def __init__(self, user):
+        self.user = user
+        self.posts = Post.objects.all()
+        self.ordering = ('-pub_date', '-id')
+        self.condition = Q()
+        self.window = slice(None)
+
+    def clone(self, **changes):
+        feed = copy.copy(self)
+        feed.__dict__.update(changes)
+        return feed
+
+    def for_listing(self):
+        return self.clone(posts=self.posts.for_listing())
+
+    def values(self, *fields):
+        return self.clone(posts=self.posts.values(*fields))
+
+    def values_list(self, *fields, **kwargs):
+        return self.clone(posts=self.posts.values_list(*fields, **kwargs))
+
+    def order_by(self, *ordering):
+        directions = {field.startswith('-') for field in ordering}
+        if [field.lstrip('-') for field in ordering] != KEY or (
+                len(directions) > 1):
+            raise ValueError('Ленту можно упорядочить только по ключу '
+                             '(pub_date, id) в одном направлении')
+        return self.clone(ordering=ordering)
+
+    def reverse(self):
+        return self.clone(ordering=tuple(
+            field[1:] if field.startswith('-') else '-' + field
+            for field in self.ordering))
+
+    def filter(self, condition):
+        return self.clone(condition=self.condition & condition)
+
+    def __getitem__(self, window):
+        return self.clone(window=window)
+
+    def authors(self):
+        '''Подписки пользователя на авторов с неразложенными постами'''
+        return Follow.objects.filter(user=self.user).annotate(
+            unfanned=Exists(Post.objects.filter(
+                author=OuterRef('author'), fanned_out=False)),
+        ).filter(unfanned=True).values_list('author', flat=True)
+
+    @cached_property
+    def unfanned_authors(self):
+        return list(self.authors())
+
+    def sources(self, authors):
+        '''Запросы ключей: записи ленты и по одному на каждого автора'''
+        entries = TimelineEntry.objects.filter(
+            entry_condition(self.condition), user=self.user,
+        ).order_by(*(
+            field.replace('id', 'post_id') if field.lstrip('-') == 'id'
+            else field for field in self.ordering
+        )).values_list('pub_date', 'post')
+        unfanned = Post.objects.filter(
+            self.condition, fanned_out=False,
+        ).order_by(*self.ordering).values_list('pub_date', 'id')
+        queries = [entries] + [unfanned.filter(author_id=author_id)
+                               for author_id in authors]
+        if self.window.stop is None:
+            return queries
+        return [query[:self.window.stop] for query in queries]
+
+    def __iter__(self):
+        keys = set()
+        for query in self.sources(self.unfanned_authors):
+            keys.update(query)
+        keys = sorted(keys, reverse=self.ordering[0].startswith('-'))
+        ids = [pk for _, pk in keys[self.window]]
+        return iter(self.posts.filter(pk__in=ids).order_by(*self.ordering))
+
+    def explain(self):
+        '''Планы запросов среза; поиск по автору показан и без авторов'''
+        queries = [self.authors()] + self.sources(
+            self.unfanned_authors or [0])
+        return '\n'.join(query.explain() for query in queries)
+
+
+def feed(user):
+    '''Лента подписок: записи ленты плюс неразложенные посты авторов'''
+    return Feed(user)
@@ -1,10 +1,238 @@
-from django.core.paginator import Paginator
+import base64
+import hashlib
+import math
+
+from django.core.cache import cache
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
 
 NUM_OF_POSTS = 10
+NUM_OF_COMMENTS = 20
+COMMENT_ORDERINGS = {
+    'old': ('created', 'id'),
+    'new': ('-created', '-id'),
+}
+APPROXIMATE_COUNT_LIMIT = 10000
+APPROXIMATE_COUNT_TIMEOUT = 60
+PAGES_ON_EACH_SIDE = 3
+PAGES_ON_ENDS = 1
+
+
+def encode_cursor(values):
+    '''Упаковывает ключ (дата, id) записи в строку для адреса страницы'''
+    raw = f'{values[0].isoformat()}|{values[1]}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    '''Распаковывает курсор, для испорченного значения возвращает None'''
+    try:
+        padding = '=' * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(cursor + padding).decode()
+        date, pk = raw.split('|')
+        date = parse_datetime(date)
+        pk = int(pk)
+    except ValueError:
+        return None
+    if date is None:
+        return None
+    return date, pk
+
+
+class CursorPaginator(Paginator):
+    '''Постраничный вывод по ключу (дата, id) без COUNT(*) и OFFSET.
+
+    Соседние страницы выбираются условием по ключу последней или первой
+    записи текущей страницы, поэтому глубокие страницы стоят столько же,
+    сколько первая. Число страниц известно только до следующей
+    страницы включительно; в режиме approximate оно берётся из
+    переданного счётчика total или оценивается ограниченным подсчётом,
+    кэшируемым на APPROXIMATE_COUNT_TIMEOUT секунд.
+    '''
+
+    def __init__(self, object_list, per_page,
+                 ordering=('-pub_date', '-id'), approximate=False,
+                 total=None):
+        self.ordering = ordering
+        self.fields = [field.lstrip('-') for field in ordering]
+        self.descending = ordering[0].startswith('-')
+        self.approximate = approximate or total is not None
+        self.total = total
+        self.number = 1
+        self.rows = []
+        self.has_next_rows = False
+        super().__init__(object_list.order_by(*ordering), per_page)
+
+    def key(self, row):
+        if isinstance(row, dict):
+            return tuple(row[field] for field in self.fields)
+        return tuple(getattr(row, field) for field in self.fields)
+
+    def seek_filter(self, key, forward):
+        '''Условие «строго после ключа» в направлении обхода'''
+        lookup = 'lt' if self.descending == forward else 'gt'
+        first, second = self.fields
+        # Граница по первому полю отдельным условием, чтобы SQLite
+        # начал чтение индекса с курсора, а не с начала списка
+        return Q(**{f'{first}__{lookup}e': key[0]}) & (
+            Q(**{f'{first}__{lookup}': key[0]})
+            | Q(**{f'{second}__{lookup}': key[1]})
+        )
+
+    def seek(self, cursor, forward):
+        '''Выбирает per_page + 1 строк за курсором поиском по индексу'''
+        queryset = self.object_list.filter(self.seek_filter(cursor, forward))
+        if not forward:
+            queryset = queryset.reverse()
+        rows = list(queryset[:self.per_page + 1])
+        more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if not forward:
+            rows.reverse()
+        return rows, more
+
+    def clean_number(self, number):
+        try:
+            return max(self.validate_number(number), 1)
+        except (PageNotAnInteger, EmptyPage):
+            return 1
+
+    def validate_number(self, number):
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('Номер страницы не является целым числом')
+        if number < 1:
+            raise EmptyPage('Номер страницы меньше 1')
+        if self.rows and number > self.num_pages:
+            raise EmptyPage('Страница не содержит результатов')
+        return number
+
+    def get_page(self, number=None, after=None, before=None):
+        '''Возвращает страницу по курсору after/before или по номеру.
+
+        Переход по номеру без курсора (ссылка «Первая» или номер из
+        окна страниц) выполняется через OFFSET, последовательная
+        навигация — только по курсорам.
+        '''
+        number = self.clean_number(number)
+        after = decode_cursor(after) if after else None
+        before = decode_cursor(before) if before else None
+        if after is not None:
+            rows, more = self.seek(after, forward=True)
+            self.number = max(number, 2)
+            self.has_next_rows = more
+        elif before is not None:
+            rows, more = self.seek(before, forward=False)
+            self.number = number if more else 1
+            self.has_next_rows = True
+        else:
+            offset = (number - 1) * self.per_page
+            rows = list(self.object_list[offset:offset + self.per_page + 1])
+            if not rows and number > 1:
+                return self.get_page()
+            self.number = number
+            self.has_next_rows = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+        self.rows = rows
+        page = Page(rows, self.number, self)
+        page.next_cursor = (
+            encode_cursor(self.key(rows[-1]))
+            if rows and self.has_next_rows else None
+        )
+        page.previous_cursor = (
+            encode_cursor(self.key(rows[0]))
+            if rows and self.number > 1 else None
+        )
+        return page
+
+    def page(self, number):
+        return self.get_page(number)
+
+    @cached_property
+    def count(self):
+        known = (
+            (self.number - 1) * self.per_page
+            + len(self.rows) + int(self.has_next_rows)
+        )
+        if self.approximate:
+            return max(known, self.approximate_count())
+        return known
+
+    @property
+    def num_pages(self):
+        known = self.number + 1 if self.has_next_rows else self.number
+        if self.approximate:
+            return max(known, math.ceil(self.count / self.per_page))
+        return known
+
+    def approximate_count(self):
+        '''Подсчёт, ограниченный APPROXIMATE_COUNT_LIMIT строками'''
+        if self.total is not None:
+            return self.total
+        query = str(self.object_list.query).encode()
+        key = 'paginator-count:' + hashlib.md5(query).hexdigest()
+        count = cache.get(key)
+        if count is None:
+            limited = self.object_list.order_by()[:APPROXIMATE_COUNT_LIMIT]
+            count = limited.count()
+            cache.set(key, count, APPROXIMATE_COUNT_TIMEOUT)
+        return count
+
+
+def page_window(number, num_pages, on_each_side=PAGES_ON_EACH_SIDE,
+                on_ends=PAGES_ON_ENDS):
+    '''Номера страниц у краёв и вокруг текущей, пропуски обозначены None.
+
+    Длина окна не зависит от числа страниц, поэтому отрисовка
+    пагинатора не растёт вместе с группой или лентой.
+    '''
+    start = max(number - on_each_side, 1)
+    end = min(number + on_each_side, num_pages)
+    window = list(range(start, end + 1))
+    if start > on_ends + 2:
+        window = list(range(1, on_ends + 1)) + [None] + window
+    else:
+        window = list(range(1, start)) + window
+    if end < num_pages - on_ends - 1:
+        window += [None] + list(range(num_pages - on_ends + 1,
+                                      num_pages + 1))
+    else:
+        window += list(range(end + 1, num_pages + 1))
+    return window
+
+
+def windowed(page):
+    '''Добавляет странице окно номеров page_window для пагинатора'''
+    page.page_window = page_window(page.number, page.paginator.num_pages)
+    return page
+
+
+def pages(request, posts, approximate=False, total=None):
+    paginator = CursorPaginator(posts, NUM_OF_POSTS,
+                                approximate=approximate, total=total)
+    return windowed(paginator.get_page(
+        request.GET.get('page'),
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    ))
+
+
+def comment_order(request):
+    order = request.GET.get('order')
+    return order if order in COMMENT_ORDERINGS else 'old'
 
 
-def pages(request, posts):
-    paginator = Paginator(posts, NUM_OF_POSTS)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    return page_obj
+def comment_pages(request, comments):
+    '''Страница комментариев по курсору, старые или новые первыми'''
+    paginator = CursorPaginator(
+        comments, NUM_OF_COMMENTS,
+        ordering=COMMENT_ORDERINGS[comment_order(request)],
+    )
+    return paginator.get_page(
+        request.GET.get('page'),
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    )
@@ -1,15 +1,31 @@
+import json
+
 from django.contrib.auth.decorators import login_required
+from django.core.paginator import Paginator
+from django.db.models import Exists, OuterRef
+from django.http import JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.views.decorators.http import require_POST
+
+from core.cache import cache_page_versioned
+from core.db import use_primary
 
+from . import counters, follows, timeline
+from .cache import group_scopes, index_scopes, post_scopes, profile_scopes
 from .forms import CommentForm, PostForm
-from .models import Comment, Follow, Group, Post, User
-from .utils import pages
+from .models import Follow, Group, Post, User
+from .search import search_posts
+from .utils import (NUM_OF_POSTS, comment_order, comment_pages, pages,
+                    windowed)
+
+FOLLOW_BULK_LIMIT = 1000
 
 
+@cache_page_versioned(index_scopes)
 def index(request):
     '''Принимает запрос, возвращает главную страницу'''
     template = 'posts/index.html'
-    posts = Post.objects.select_related('author', 'group')
+    posts = Post.objects.for_listing()
     page_obj = pages(request, posts)
     context = {
         'page_obj': page_obj
@@ -17,12 +33,13 @@ def index(request):
     return render(request, template, context)
 
 
+@cache_page_versioned(group_scopes)
 def group_posts(request, slug):
     '''Принимает запрос и слаг, возвращает страницу группы'''
     template = 'posts/group_list.html'
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()
-    page_obj = pages(request, posts)
+    posts = group.posts.for_listing()
+    page_obj = pages(request, posts, total=group.posts_count)
     context = {
         'group': group,
         'page_obj': page_obj,
@@ -30,40 +47,79 @@ def group_posts(request, slug):
     return render(request, template, context)
 
 
+@cache_page_versioned(profile_scopes)
 def profile(request, username):
     '''Принимает запрос и имя пользователя, возвращает страницу пользователя'''
     template = 'posts/profile.html'
-    author = get_object_or_404(User, username=username)
-    posts = author.posts.all()
-    page_obj = pages(request, posts)
-    posts_number = posts.count()
+    authors = User.objects.select_related('stats')
     if request.user.is_authenticated:
-        following = Follow.objects.filter(user=request.user,
-                                          author=author).exists()
-    else:
-        following = False
+        authors = authors.annotate(is_followed=Exists(Follow.objects.filter(
+            user=request.user, author=OuterRef('pk'))))
+    author = get_object_or_404(authors, username=username)
+    posts_number = counters.stats_for(author).posts_count
+    posts = author.posts.for_listing()
+    page_obj = pages(request, posts, total=posts_number)
     context = {
         'page_obj': page_obj,
         'author': author,
         'posts_number': posts_number,
-        'following': following
+        'following': getattr(author, 'is_followed', False)
     }
     return render(request, template, context)
 
 
+@cache_page_versioned(post_scopes)
 def post_detail(request, post_id):
     '''Принимает запрос и id поста, возвращает страницу поста'''
     template = 'posts/post_detail.html'
-    post = get_object_or_404(Post, id=post_id)
-    author = post.author
-    posts_count = author.posts.filter(author=author).count()
+    post = get_object_or_404(Post.objects.for_detail(), id=post_id)
+    posts_count = counters.stats_for(post.author).posts_count
     form = CommentForm(request.POST or None)
-    comments = Comment.objects.filter(post=post)
     context = {
         'post': post,
         'posts_number': posts_count,
         'form': form,
+        'comments': comment_pages(request, post.comments.for_listing()),
+        'order': comment_order(request),
+    }
+    return render(request, template, context)
+
+
+@cache_page_versioned(post_scopes)
+def post_comments(request, post_id):
+    '''Следующая страница комментариев фрагментом HTML или JSON'''
+    post = get_object_or_404(Post.objects.only('id'), id=post_id)
+    comments = comment_pages(request, post.comments.for_listing())
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'results': [
+                {
+                    'id': comment.id,
+                    'author': comment.author.username,
+                    'text': comment.text,
+                    'created': comment.created,
+                }
+                for comment in comments
+            ],
+            'next': comments.next_cursor,
+        })
+    context = {
+        'post': post,
         'comments': comments,
+        'order': comment_order(request),
+    }
+    return render(request, 'includes/comments.html', context)
+
+
+def search(request):
+    '''Принимает запрос со строкой q, возвращает найденные посты'''
+    template = 'posts/search.html'
+    query = request.GET.get('q', '').strip()
+    paginator = Paginator(search_posts(query), NUM_OF_POSTS)
+    page_obj = windowed(paginator.get_page(request.GET.get('page')))
+    context = {
+        'query': query,
+        'page_obj': page_obj,
     }
     return render(request, template, context)
 
@@ -121,15 +177,18 @@ def add_comment(request, post_id):
         comment.author = request.user
         comment.post = post
         comment.save()
+        if request.is_ajax():
+            return render(request, 'includes/comment.html',
+                          {'comment': comment}, status=201)
+    elif request.is_ajax():
+        return JsonResponse({'errors': form.errors}, status=400)
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
 def follow_index(request):
     template = 'posts/follow.html'
-    posts = Post.objects.filter(
-        author__following__user=request.user,
-    ).select_related('author', 'group')
+    posts = timeline.feed(request.user).for_listing()
     page_obj = pages(request, posts)
     context = {
         'page_obj': page_obj,
@@ -138,17 +197,65 @@ def follow_index(request):
 
 
 @login_required
+@use_primary
 def profile_follow(request, username):
-    user = get_object_or_404(User, username=request.user)
     author = get_object_or_404(User, username=username)
-    if user == author:
-        return redirect('posts:profile', username=username)
-    Follow.objects.get_or_create(author=author, user=request.user)
+    follows.follow(request.user, author)
     return redirect('posts:profile', username=username)
 
 
 @login_required
+@use_primary
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
-    Follow.objects.filter(user=request.user, author=author).delete()
+    follows.unfollow(request.user, author)
     return redirect('posts:profile', username=username)
+
+
+@login_required
+@require_POST
+def follow_bulk(request):
+    '''Подписывает и отписывает от списков авторов из тела JSON.
+
+    Тело: {"follow": [имена], "unfollow": [имена]}. Неизвестные имена
+    возвращаются в поле missing.
+    '''
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        data = None
+    names = None
+    if isinstance(data, dict):
+        names = {
+            action: data.get(action, [])
+            for action in ('follow', 'unfollow')
+        }
+    if names is None or not all(
+            isinstance(group, list)
+            and all(isinstance(name, str) for name in group)
+            for group in names.values()):
+        return JsonResponse(
+            {'error': 'Ожидается {"follow": [...], "unfollow": [...]}'},
+            status=400,
+        )
+    if sum(map(len, names.values())) > FOLLOW_BULK_LIMIT:
+        return JsonResponse(
+            {'error': f'Не больше {FOLLOW_BULK_LIMIT} имён за запрос'},
+            status=400,
+        )
+    authors = User.objects.in_bulk(
+        [name for group in names.values() for name in group],
+        field_name='username',
+    )
+    follows.follow_many(request.user, [
+        authors[name] for name in names['follow'] if name in authors])
+    follows.unfollow_many(request.user, [
+        authors[name] for name in names['unfollow'] if name in authors])
+    return JsonResponse({
+        'followed': [name for name in names['follow'] if name in authors],
+        'unfollowed': [
+            name for name in names['unfollow'] if name in authors],
+        'missing': [
+            name for group in names.values() for name in group
+            if name not in authors],
+    })
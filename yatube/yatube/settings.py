@@ -39,6 +39,8 @@ INSTALLED_APPS = [
     'posts.apps.PostsConfig',
     'users.apps.UsersConfig',
     'core.apps.CoreConfig',
+    'benchmarks.apps.BenchmarksConfig',
+    'api.apps.ApiConfig',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -49,23 +51,39 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.db.ReplicaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
 ROOT_URLCONF = 'yatube.urls'
 
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
+# Вне отладки шаблоны компилируются один раз на процесс, а включения
+# вида {% include 'имя' %} подставляются в текст шаблона заранее.
+if not DEBUG:
+    TEMPLATE_LOADERS = [
+        ('django.template.loaders.cached.Loader', [
+            ('core.loaders.Loader', TEMPLATE_LOADERS),
+        ]),
+    ]
+
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.metrics.TimedDjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
-        'APP_DIRS': True,
         'OPTIONS': {
+            'loaders': TEMPLATE_LOADERS,
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -87,9 +105,41 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'CONN_MAX_AGE': 60,
     }
 }
 
+# Выполняются для каждого нового соединения SQLite. WAL позволяет
+# читать во время записи, busy_timeout ждёт освобождения блокировки
+# вместо ошибки «database is locked».
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,
+    'busy_timeout': 5000,
+}
+
+# Реплики только для чтения. Для локальной проверки подойдут копии
+# основной базы SQLite, например DATABASE_REPLICAS = ['replica'];
+# копии обновляет команда sync_replicas.
+DATABASE_REPLICAS = []
+
+DATABASES.update({
+    alias: {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, f'db.{alias}.sqlite3'),
+        'CONN_MAX_AGE': 60,
+        'TEST': {'MIRROR': 'default'},
+    }
+    for alias in DATABASE_REPLICAS
+})
+
+DATABASE_ROUTERS = ['core.db.ReplicaRouter']
+
+# Сколько секунд после записи сессия читает с основной базы
+REPLICA_STICKY_SECONDS = 10
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -139,13 +189,58 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 POST_STR_SYMBOLS = 15
 
+TIMELINE_CELEBRITY_FOLLOWERS = 1000
+TIMELINE_SYNC_FANOUT = 100
+
+SEARCH_BACKEND = 'posts.search.SQLiteFTSBackend'
+
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+POST_THUMBNAIL_SIZES = {
+    'card': (960, 339),
+    'card_small': (480, 170),
+}
+
+# Загруженные картинки уменьшаются до этого размера и перекодируются
+# в первый доступный формат списка; обработка идёт в пуле процессов
+# из POST_IMAGE_WORKERS процессов (0 — в текущем процессе).
+POST_IMAGE_MAX_SIZE = (2048, 2048)
+POST_IMAGE_FORMATS = ('WEBP', 'JPEG')
+POST_IMAGE_WORKERS = 2
+
+TASKS_ALWAYS_EAGER = False
+TASKS_WORKERS = 2
+TASKS_RETRY_DELAY = 30
+TASKS_LOCK_TIMEOUT = 60 * 10
+
+# Поколения страниц (core.cache) сдвигают веб-процессы, runworker и
+# команды вроде import_posts, поэтому кэш должен быть общим для всех
+# процессов. Кэш в памяти процесса (locmem) подходит только для
+# разработки и тестов: с ним страницы хранятся PAGE_CACHE_LOCAL_TIMEOUT
+# секунд, а ETag и Last-Modified не выдаются. Для работы укажите общий
+# кэш, например memcached:
+#     'BACKEND': 'django.core.cache.backends.memcached.PyLibMCCache',
+#     'LOCATION': '127.0.0.1:11211',
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
     }
 }
+
+PAGE_CACHE_TIMEOUT = 60 * 60 * 24
+PAGE_CACHE_LOCAL_TIMEOUT = 30
+
+# Пределы числа SQL-запросов и времени ответа (в секундах) по именам
+# представлений; превышение пишется в журнал core.metrics.
+VIEW_BUDGETS = {
+    'posts:index': {'queries': 4, 'time': 0.25},
+    'posts:group_posts': {'queries': 5, 'time': 0.25},
+    'posts:profile': {'queries': 5, 'time': 0.25},
+    'posts:post_detail': {'queries': 6, 'time': 0.25},
+    'posts:follow_index': {'queries': 6, 'time': 0.25},
+    'posts:search': {'queries': 5, 'time': 0.5},
+}